@@ -0,0 +1,36 @@
+"""Measure how many conversations per second Cleverbot.conversation and
+Cleverbot.conversations_from make.
+
+Usage: python benchmarks/conversations.py [number]
+"""
+import sys
+import timeit
+
+import cleverbot
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    records = [(str(i), str(i), str(i), i, (25, 50, 75))
+               for i in range(number)]
+
+    def one_by_one():
+        cb = cleverbot.Cleverbot('API_KEY')
+        for name, cs, key, timeout, tweaks in records:
+            tweak1, tweak2, tweak3 = tweaks
+            cb.conversation(name, cs=cs, key=key, timeout=timeout,
+                            tweak1=tweak1, tweak2=tweak2, tweak3=tweak3)
+
+    def bulk():
+        cb = cleverbot.Cleverbot('API_KEY')
+        cb.conversations_from(records)
+
+    for name, func in (('conversation', one_by_one),
+                       ('conversations_from', bulk)):
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print("{:<18} {:10.0f} conversations/s".format(
+            name, number / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Measure how long loading a pickled Cleverbot takes with and without the
+cached migration plans and the batched migration of its conversations,
+along with a single migration plan lookup.
+
+Usage: python benchmarks/load.py [conversations]
+"""
+import io
+import sys
+import timeit
+import warnings
+
+import cleverbot
+from cleverbot import migrations, utils
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # distutils' StrictVersion warns on every use on newer Pythons
+    warnings.simplefilter('ignore', DeprecationWarning)
+    cb = cleverbot.Cleverbot('API_KEY')
+    cb.conversations_from((str(i), str(i), None, None, None)
+                          for i in range(number))
+    with io.BytesIO() as f:
+        cb.save(f)
+        data = f.getvalue()
+    # Pretend everything was saved by an older version without migrations
+    data = data.replace(cleverbot.__version__.encode(), b'2.4.9')
+    cls = type(cb.conversations['0'])
+
+    def load():
+        with io.BytesIO(data) as f:
+            cleverbot.load(f)
+
+    def lookup():
+        utils.get_migrations('2.4.9', cleverbot.__version__, cls)
+
+    def uncached_lookup():
+        utils._get_migrations('2.4.9', cleverbot.__version__, cls)
+
+    def unbatched_load():
+        # Migrates every conversation on its own as it's unpickled
+        with io.BytesIO(data) as f:
+            utils.GenericUnpickler(f, module='cleverbot.cleverbot').load()
+
+    def uncached_load():
+        get_migrations = utils.get_migrations
+        migrations.get_migrations = utils._get_migrations
+        try:
+            load()
+        finally:
+            migrations.get_migrations = get_migrations
+
+    for name, func in (('uncached load', uncached_load),
+                       ('unbatched load', unbatched_load),
+                       ('batched load', load)):
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print("{:<15} {:8.3f} us/conversation".format(
+            name, elapsed / number * 1e6))
+    for name, func in (('uncached lookup', uncached_lookup),
+                       ('cached lookup', lookup)):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        print("{:<15} {:8.3f} us/call".format(name, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""Measure how long building the request parameters takes per call with and
+without the cached request template.
+
+Usage: python benchmarks/params.py [number]
+"""
+import sys
+import timeit
+
+import cleverbot
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    cb = cleverbot.Cleverbot('API_KEY', timeout=60, tweak1=25, tweak2=50,
+                             tweak3=75)
+    convo = cb.conversation(key='KEY', cs='76nxdxIJ02AAA', tweak1=10)
+
+    def cached():
+        convo._get_params("Hello", {})
+
+    def uncached():
+        convo._template = None
+        convo._get_params("Hello", {})
+
+    for name, func in (('uncached', uncached), ('cached', cached)):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        print("{:<9} {:8.3f} us/call".format(name, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,5 +3,18 @@ __version__ = '2.5.0'
 # Fix for circular import
 from . import migrations
 
+from .admission import AdmissionController
+from .breaker import CircuitBreaker
+from .checkpoint import Checkpointer
 from .cleverbot import Cleverbot, load
-from .errors import CleverbotError, APIError, DecodeError, Timeout
+from .columns import ColumnFile
+from .errors import (CleverbotError, APIError, BudgetExceeded, CircuitOpen,
+                     DeadlineExceeded, DecodeError, Overloaded, QueueFull,
+                     RequestSizeWarning, RequestTooLarge, Timeout,
+                     TransportError)
+from .fallback import DegradedReply, ReplyCorpus
+from .guard import SizeGuard
+from .index import IndexedFile
+from .scheduler import Scheduler
+from .session import SharedSession
+from .workers import WorkerPool
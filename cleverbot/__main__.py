@@ -1,13 +1,40 @@
 from __future__ import absolute_import, print_function
 
 import argparse
+import bisect
+import collections
+import cProfile
 import getpass
 import inspect
+import io
+import json
 import os
 import pickle
+import pstats
 import sys
+import threading
+import time
 from distutils.version import StrictVersion
 
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlsplit
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlsplit
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
 import cleverbot
 from cleverbot.migrations import migratables
 from cleverbot.utils import get_migrations
@@ -35,6 +62,54 @@ class SubParsersAction(argparse._SubParsersAction):
         parser.func = globals()[parser_name]
 
 
+class FakeServer(ThreadingMixIn, HTTPServer):
+    """A local stand-in for the API that echoes the input back and grows
+    the cleverbot state with every reply.
+    """
+
+    daemon_threads = True
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+        wbufsize = -1  # Send the headers and body together
+
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            input = query.get('input', [''])[0]
+            cs = query.get('cs', [''])[0] + format(len(input), 'x')
+            body = json.dumps({'output': input, 'cs': cs,
+                               'interaction_count': str(len(cs))})
+            body = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), self.Handler)
+        self.url = 'http://{}:{}/getreply'.format(*self.server_address)
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+
 def prompt(text, required=False, hidden=False):
     while True:
         if hidden:
@@ -77,6 +152,319 @@ def say(parser, args):
         cb.close()
 
 
+def batch(parser, args):
+    options = vars(args)
+    key = options.pop('key', None)
+    if not key:
+        parser.error("the --key argument is required")
+    url = options.pop('url', None)
+    input, output = options.pop('input'), options.pop('output')
+    workers = options.pop('workers')
+    checkpoint = options.pop('checkpoint', None)
+    interval = options.pop('checkpoint_interval')
+    settings = {name: options.pop(name) for name in list(options)
+                if name in ('cs', 'timeout', 'tweak1', 'tweak2', 'tweak3')}
+
+    # The results are appended to the checkpoint as they're written and only
+    # how far every conversation got is kept in memory to resume from
+    progress = {}  # Conversation name -> [processed records, cleverbot state]
+    journal = None
+    if checkpoint is not None:
+        end = 0
+        if os.path.exists(checkpoint):
+            with open(checkpoint, 'rb') as file:
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break  # Cut off by an interruption
+                    try:
+                        result = json.loads(line.decode('utf-8'))
+                        entry = progress.setdefault(result['conversation'],
+                                                    [0, None])
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    entry[0] += 1
+                    entry[1] = result.get('cs')
+                    end += len(line)
+        journal = open(checkpoint, 'a')
+        journal.truncate(end)  # Drop whatever was cut off
+
+    cb = cleverbot.Cleverbot(key, **settings)
+    if url is not None:
+        cb.url = url
+    # Every conversation is pinned to a single worker to keep its order
+    queues = [queue.Queue(maxsize=workers * 8) for _ in range(workers)]
+    results = queue.Queue(maxsize=workers * 8)
+    done = object()
+
+    def work(requests):
+        while True:
+            request = requests.get()
+            if request is done:
+                results.put(done)
+                return
+
+            convo, kwargs, result = request
+            try:
+                result['output'] = convo.say(**kwargs)
+            except Exception as error:
+                result['error'] = str(error)
+            result['cs'] = convo.cs
+            results.put(result)
+
+    def write():
+        finished = processed = 0
+        while finished < workers:
+            result = results.get()
+            if result is done:
+                finished += 1
+                continue
+
+            json.dump(result, output)
+            output.write('\n')
+            output.flush()
+            if journal is None:
+                continue
+
+            # Written in one go so an interruption can only cut off the end
+            journal.write(json.dumps(result) + '\n')
+            processed += 1
+            if processed % interval == 0:
+                journal.flush()
+        if journal is not None:
+            journal.flush()
+
+    threads = [threading.Thread(target=work, args=(requests,))
+               for requests in queues]
+    threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    skip = {name: entry[0] for name, entry in progress.items()}
+    states = {name: entry[1] for name, entry in progress.items()}
+    del progress
+    try:
+        for number, line in enumerate(input, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                name = str(record.pop('conversation'))
+            except (ValueError, KeyError, AttributeError):
+                parser.error("invalid record on line {}".format(number))
+
+            if skip.get(name):
+                skip[name] -= 1
+                continue
+            if cb.conversations is None or name not in cb.conversations:
+                convo = cb.conversation(name)
+                if name in states:
+                    convo.cs = states.pop(name)
+            else:
+                convo = cb.conversations[name]
+            result = {'conversation': name, 'input': record.get('input')}
+            requests = queues[hash(name) % workers]
+            requests.put((convo, dict(options, **record), result))
+    finally:
+        for requests in queues:
+            requests.put(done)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.1)  # Stay interruptible
+        cb.close()
+        if journal is not None:
+            journal.close()
+
+
+def bench(parser, args):
+    options = vars(args)
+    key = options.pop('key', None)
+    if not key:
+        parser.error("the --key argument is required")
+    url, input = options.pop('url', None), options.pop('input')
+    concurrency, qps = options.pop('concurrency'), options.pop('qps', None)
+    duration, as_json = options.pop('duration'), options.pop('json')
+    settings = {name: options.pop(name) for name in list(options)
+                if name in ('cs', 'timeout', 'tweak1', 'tweak2', 'tweak3')}
+    clock = getattr(time, 'perf_counter', time.time)
+
+    cb = cleverbot.Cleverbot(key, **settings)
+    if url is not None:
+        cb.url = url
+    # A conversation is only ever used by one request at a time
+    convos = queue.Queue()
+    for name in range(options.pop('conversations')):
+        convos.put(cb.conversation(str(name)))
+
+    lock = threading.Lock()
+    latencies = []
+    errors = collections.Counter()
+    start = clock()
+    end = start + duration
+    schedule = [start]
+
+    def work():
+        while True:
+            if qps is not None:
+                with lock:
+                    scheduled = schedule[0]
+                    schedule[0] += 1.0 / qps
+                if scheduled >= end:
+                    return
+                delay = scheduled - clock()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = clock()
+                if scheduled >= end:
+                    return
+
+            convo = convos.get()
+            try:
+                convo.say(input, **options)
+            except Exception as error:
+                with lock:
+                    errors[type(error).__name__] += 1
+            else:
+                # Measure from the scheduled time so a backed up client
+                # doesn't hide its own queueing delay
+                latency = clock() - scheduled
+                with lock:
+                    latencies.append(latency)
+            finally:
+                convos.put(convo)
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.1)  # Stay interruptible
+    finally:
+        elapsed = clock() - start
+        cb.close()
+
+    latencies.sort()
+    report = collections.OrderedDict([
+        ('requests', len(latencies) + sum(errors.values())),
+        ('successes', len(latencies)),
+        ('errors', dict(errors)),
+        ('duration', elapsed),
+        ('throughput', len(latencies) / elapsed),
+        ('latency_ms', collections.OrderedDict()),
+    ])
+    if latencies:
+        percentiles = report['latency_ms']
+        percentiles['mean'] = sum(latencies) / len(latencies) * 1000
+        for percentile in (50, 90, 95, 99, 99.9):
+            index = int(percentile / 100.0 * len(latencies) + 0.5) - 1
+            latency = latencies[max(0, min(index, len(latencies) - 1))]
+            percentiles['p{:g}'.format(percentile)] = latency * 1000
+        percentiles['max'] = latencies[-1] * 1000
+
+    if as_json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    print("requests:   {requests} ({successes} successful)".format(**report))
+    print("duration:   {duration:.2f}s".format(**report))
+    print("throughput: {throughput:.2f} replies/s".format(**report))
+    for name, count in sorted(errors.items()):
+        print("{:<11} {}".format(name + ':', count))
+    if latencies:
+        print()
+        print("latency (ms)")
+        for name, latency in report['latency_ms'].items():
+            print("  {:<6} {:10.2f}".format(name, latency))
+
+
+def profile(parser, args):
+    output = args.output
+    top = args.top
+
+    def workload(url):
+        cb = cleverbot.Cleverbot('PROFILE', tweak1=25, tweak2=50, tweak3=75)
+        cb.url = url
+        convos = [cb.conversation(str(name))
+                  for name in range(args.conversations)]
+        for turn in range(args.turns):
+            for convo in convos:
+                convo.say("Turn {} of the canned workload".format(turn))
+        with io.BytesIO() as file:
+            cb.save(file)
+            file.seek(0)
+            loaded = cleverbot.load(file)
+        # Take the snapshot while the conversations are still alive
+        snapshot = None
+        if tracemalloc is not None:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            profiler.enable()
+        loaded.close()
+        cb.close()
+        return snapshot
+
+    profiler = cProfile.Profile()
+    with FakeServer() as server:
+        if tracemalloc is not None:
+            tracemalloc.start(1)
+            baseline = tracemalloc.take_snapshot()
+        profiler.enable()
+        try:
+            snapshot = workload(server.url)
+        finally:
+            profiler.disable()
+            if tracemalloc is not None:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+    output.write("cleverbot.py {} profile: {} conversations, {} turns\n\n"
+                 .format(cleverbot.__version__, args.conversations,
+                         args.turns))
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats(args.sort).print_stats(top)
+
+    if tracemalloc is None:
+        output.write("Allocation summary requires tracemalloc (Python 3.4+)\n")
+        return
+
+    # Attribute every allocation to the profiled function it happened in
+    functions = collections.defaultdict(list)
+    for filename, line, name in pstats.Stats(profiler).stats:
+        functions[filename].append((line, name))
+    for lines in functions.values():
+        lines.sort()
+    # Only what the workload left behind in the package itself
+    package = os.path.dirname(os.path.abspath(cleverbot.__file__))
+    filters = [tracemalloc.Filter(True, os.path.join(package, '*'))]
+    snapshot = snapshot.filter_traces(filters)
+    baseline = baseline.filter_traces(filters)
+    sizes = collections.Counter()
+    counts = collections.Counter()
+    for stat in snapshot.compare_to(baseline, 'lineno'):
+        frame = stat.traceback[0]
+        lines = functions.get(frame.filename, [])
+        index = bisect.bisect_right(lines, (frame.lineno, chr(0x10ffff))) - 1
+        if index >= 0:
+            key = '{}:{}({})'.format(os.path.basename(frame.filename),
+                                     *lines[index])
+        else:
+            key = '{}:{}'.format(os.path.basename(frame.filename),
+                                 frame.lineno)
+        sizes[key] += stat.size_diff
+        counts[key] += stat.count_diff
+
+    output.write("Peak traced memory: {} bytes\n\n".format(peak))
+    output.write("Allocations held in cleverbot at the end of the workload "
+                 "by function\n\n")
+    output.write("{:>12} {:>10}  function\n".format('bytes', 'blocks'))
+    for key, size in sizes.most_common(top):
+        output.write("{:>12} {:>10}  {}\n".format(size, counts[key], key))
+
+
 def migrate(parser, args):
 
     def get_version(object):
@@ -134,6 +522,73 @@ def add_subparsers(parser):
             kwargs = {'required': True}
         parser.add_argument('--key', help="your API key", **kwargs)
 
+    def add_batch_parser(subparsers):
+        parser = subparsers.add_parser(
+            'batch', usage='[-h] [--url URL] [-o OUTPUT] [-w WORKERS] '
+                           '[-c CHECKPOINT] [--kwargs KWARGS ...] [input]',
+            description="Talk to Cleverbot in bulk. Reads JSON lines with a "
+                        "conversation name, an input and optionally any "
+                        "other parameters and writes a JSON line for every "
+                        "reply as it arrives.",
+            help="talk to Cleverbot in bulk")
+        parser.add_argument('input', nargs='?', type=argparse.FileType('r'),
+                            default=sys.stdin,
+                            help="the file to read requests from")
+        parser.add_argument('--url', help="the endpoint to send requests to")
+        parser.add_argument('-o', '--output', type=argparse.FileType('w'),
+                            default=sys.stdout,
+                            help="the file to write replies to")
+        parser.add_argument('-w', '--workers', type=int, default=8,
+                            help="how many requests to make concurrently")
+        parser.add_argument('-c', '--checkpoint',
+                            help="the file to append written replies to and "
+                                 "resume from")
+        parser.add_argument('--checkpoint-interval', type=int, default=100,
+                            help="how many replies to write between flushing "
+                                 "the checkpoint")
+
+    def add_bench_parser(subparsers):
+        parser = subparsers.add_parser(
+            'bench', usage='[-h] [--url URL] [-n CONVERSATIONS] [-d DURATION] '
+                           '[-c CONCURRENCY] [--qps QPS] [--json] '
+                           '[--kwargs KWARGS ...] [input]',
+            description="Generate load against the API and report the "
+                        "throughput, errors and latency percentiles.",
+            help="generate load against the API")
+        parser.add_argument('input', nargs='?', default="Hello",
+                            help="what to say to Cleverbot on every request")
+        parser.add_argument('--url', help="the endpoint to send requests to")
+        parser.add_argument('-n', '--conversations', type=int, default=10,
+                            help="how many conversations to spread the load "
+                                 "over")
+        parser.add_argument('-d', '--duration', type=float, default=10,
+                            help="how many seconds to generate load for")
+        parser.add_argument('-c', '--concurrency', type=int, default=10,
+                            help="the maximum number of requests in flight")
+        parser.add_argument('--qps', type=float,
+                            help="send requests at a fixed rate instead of "
+                                 "as fast as possible")
+        parser.add_argument('--json', action='store_true',
+                            help="output the report as JSON")
+
+    def add_profile_parser(subparsers):
+        parser = subparsers.add_parser(
+            'profile', description="Profile a canned workload against a "
+                                   "local stand-in for the API.",
+            help="profile a canned workload")
+        parser.add_argument('-n', '--conversations', type=int, default=50,
+                            help="how many conversations to talk in")
+        parser.add_argument('-t', '--turns', type=int, default=20,
+                            help="how many times to talk in every "
+                                 "conversation")
+        parser.add_argument('-s', '--sort', default='cumulative',
+                            help="the key to sort the profile by")
+        parser.add_argument('--top', type=int, default=30,
+                            help="how many entries to report")
+        parser.add_argument('-o', '--output', type=argparse.FileType('w'),
+                            default=sys.stdout,
+                            help="the file to write the report to")
+
     def add_migrate_parser(subparsers):
         parser = subparsers.add_parser(
             'migrate', description="Migrate a pickled Cleverbot instance.",
@@ -151,6 +606,9 @@ def add_subparsers(parser):
         title='subcommands', parser_class=KwargsParser,
         action=SubParsersAction)
     add_say_parser(subparsers)
+    add_batch_parser(subparsers)
+    add_bench_parser(subparsers)
+    add_profile_parser(subparsers)
     add_migrate_parser(subparsers)
 
 
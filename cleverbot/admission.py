@@ -0,0 +1,123 @@
+import threading
+
+from .errors import DeadlineExceeded, Overloaded
+from .scheduler import clock
+
+
+class AdmissionControllerBase(object):
+    """Base class for AdmissionController."""
+
+    def __init__(self, limit=10, target=0.005, interval=0.1, timeout=None):
+        self.limit = limit
+        self.target = target
+        self.interval = interval
+        self.timeout = timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.overloaded = False
+        self._min_delay = None
+        self._interval_end = None
+
+    def _get_timeout(self, deadline):
+        """Get how long a request may wait for a slot."""
+        timeout = self.target if self.overloaded else self.timeout
+        if deadline is not None and (timeout is None or deadline < timeout):
+            return deadline
+        return timeout
+
+    def _observe(self, delay, now):
+        """Feed the queueing delay of a request into the controller.
+
+        Like CoDel, the controller is overloaded for the next interval when
+        even the shortest delay of the last one was above the target, meaning
+        a queue stood for the whole interval instead of just a burst.
+        """
+        if self._min_delay is None or delay < self._min_delay:
+            self._min_delay = delay
+        if self._interval_end is None:
+            self._interval_end = now + self.interval
+        elif now >= self._interval_end:
+            self.overloaded = self._min_delay > self.target
+            self._min_delay = None
+            self._interval_end = now + self.interval
+
+    def _reject(self, deadline, delay):
+        if deadline is not None and delay >= deadline:
+            raise DeadlineExceeded(deadline)
+        self.rejected += 1
+        raise Overloaded(delay)
+
+
+class AdmissionController(AdmissionControllerBase):
+    """Shed load before it piles up in the connection pool.
+
+    At most limit requests are let through at once and the rest wait for a
+    slot. How long they wait is tracked CoDel-style: once the waits have
+    stayed above target for a whole interval the controller is overloaded
+    and requests only wait up to target for a slot before being rejected
+    with Overloaded, so the ones that get in keep a bounded latency. It
+    recovers at the end of the first interval in which a request got a slot
+    within target.
+
+    Attach it to Cleverbot with Cleverbot.admission, conversations use the
+    admission controller of their Cleverbot.
+    """
+
+    def __init__(self, limit=10, target=0.005, interval=0.1, timeout=None):
+        """Initialize the admission controller with the given arguments.
+
+        Arguments:
+            limit: How many requests may be in flight at once. Keep it at or
+                below the size of the connection pool.
+            target: How many seconds of queueing delay are acceptable.
+            interval: How many seconds the delay has to stay above target
+                before the controller is overloaded.
+            timeout: How many seconds a request may wait for a slot while
+                the controller isn't overloaded, or None to wait until the
+                deadline of the request.
+        """
+        super(AdmissionController, self).__init__(limit, target, interval,
+                                                  timeout)
+        self._condition = threading.Condition()
+
+    def enter(self, deadline=None):
+        """Wait for a slot for a request.
+
+        Arguments:
+            deadline: How many seconds the request may take.
+
+        Returns:
+            Whatever is left of the deadline, or None if there's none.
+
+        Raises:
+            Overloaded: The request was shed.
+            DeadlineExceeded: The deadline passed while waiting.
+        """
+        start = clock()
+        condition = self._condition
+        with condition:
+            if self.active >= self.limit:
+                timeout = self._get_timeout(deadline)
+                while self.active >= self.limit:
+                    if timeout is None:
+                        condition.wait()
+                        continue
+                    remaining = start + timeout - clock()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+            now = clock()
+            delay = now - start
+            self._observe(delay, now)
+            if self.active >= self.limit:
+                self._reject(deadline, delay)
+            self.active += 1
+            self.admitted += 1
+        return None if deadline is None else deadline - delay
+
+    def exit(self):
+        """Free the slot of a request once it's done."""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
@@ -1,2 +1,11 @@
+from .admission import AdmissionController
 from .cleverbot import Cleverbot, load
-from .. import __version__, CleverbotError, APIError, DecodeError, Timeout
+from .scheduler import Scheduler
+from .session import SharedSession
+from .threaded import ThreadedCleverbot
+from .workers import WorkerPool
+from .. import (__version__, Checkpointer, CircuitBreaker, CleverbotError,
+               APIError, BudgetExceeded, CircuitOpen, ColumnFile,
+               DeadlineExceeded, DecodeError, DegradedReply, IndexedFile,
+               Overloaded, QueueFull, ReplyCorpus, RequestSizeWarning,
+               RequestTooLarge, SizeGuard, Timeout, TransportError)
@@ -0,0 +1,90 @@
+import asyncio
+import collections
+
+from ..admission import AdmissionControllerBase
+from ..scheduler import clock
+
+
+class AdmissionController(AdmissionControllerBase):
+    """Shed load before it piles up in the connection pool.
+
+    At most limit requests are let through at once and the rest wait for a
+    slot. How long they wait is tracked CoDel-style: once the waits have
+    stayed above target for a whole interval the controller is overloaded
+    and requests only wait up to target for a slot before being rejected
+    with Overloaded, so the ones that get in keep a bounded latency. It
+    recovers at the end of the first interval in which a request got a slot
+    within target.
+
+    Attach it to Cleverbot with Cleverbot.admission, conversations use the
+    admission controller of their Cleverbot.
+    """
+
+    def __init__(self, limit=10, target=0.005, interval=0.1, timeout=None):
+        """Initialize the admission controller with the given arguments.
+
+        Arguments:
+            limit: How many requests may be in flight at once. Keep it at or
+                below the connection limit of the session.
+            target: How many seconds of queueing delay are acceptable.
+            interval: How many seconds the delay has to stay above target
+                before the controller is overloaded.
+            timeout: How many seconds a request may wait for a slot while
+                the controller isn't overloaded, or None to wait until the
+                deadline of the request.
+        """
+        super().__init__(limit, target, interval, timeout)
+        self._waiters = collections.deque()
+
+    @asyncio.coroutine
+    def enter(self, deadline=None):
+        """Wait for a slot for a request.
+
+        Arguments:
+            deadline: How many seconds the request may take.
+
+        Returns:
+            Whatever is left of the deadline, or None if there's none.
+
+        Raises:
+            Overloaded: The request was shed.
+            DeadlineExceeded: The deadline passed while waiting.
+        """
+        start = clock()
+        admitted = self.active < self.limit
+        if admitted:
+            self.active += 1
+        else:
+            # Freed slots are handed straight to the waiters in order
+            waiter = asyncio.Future()
+            self._waiters.append(waiter)
+            try:
+                yield from asyncio.wait_for(waiter,
+                                            self._get_timeout(deadline))
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    self.exit()  # Pass on the slot that was handed over
+                raise
+            else:
+                admitted = True
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        now = clock()
+        delay = now - start
+        self._observe(delay, now)
+        if not admitted:
+            self._reject(deadline, delay)
+        self.admitted += 1
+        return None if deadline is None else deadline - delay
+
+    def exit(self):
+        """Free the slot of a request once it's done."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
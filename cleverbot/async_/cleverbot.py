@@ -1,11 +1,22 @@
 import asyncio
 import functools
+import socket
+from urllib.parse import urlsplit
 
 import aiohttp
 
-from .. import __version__
 from ..base import CleverbotBase, ConversationBase, SayMixinBase, load
-from ..errors import APIError, DecodeError, Timeout
+from ..errors import (CleverbotError, APIError, DeadlineExceeded, DecodeError,
+                      Timeout, TransportError)
+from ..scheduler import clock
+from .session import create_session, default_session
+from .workers import WorkerPool
+
+# Older versions of aiohttp don't have these
+ClientTimeout = getattr(aiohttp, 'ClientTimeout', None)
+ServerTimeoutError = getattr(aiohttp, 'ServerTimeoutError', ())
+ConnectionTimeoutError = getattr(aiohttp, 'ConnectionTimeoutError', ())
+ContentTypeError = getattr(aiohttp, 'ContentTypeError', ())
 
 
 class SayMixin(SayMixinBase):
@@ -20,39 +31,182 @@ class SayMixin(SayMixinBase):
             input: The input argument is what you want to say to Cleverbot,
                 such as "hello".
             tweak1-3: Changes Cleverbot's mood.
+            deadline: How many seconds the whole call may take. The connect,
+                read and total timeouts are cut short to fit in it.
             **kwargs: Keyword arguments to update the request parameters with.
 
         Returns:
-            Cleverbot's reply.
+            Cleverbot's reply, or a DegradedReply from Cleverbot.fallback if
+            the call failed or ran over its budget.
 
         Raises:
             APIError: A Cleverbot API error occurred.
             DecodeError: An error occurred while reading the reply.
             Timeout: The request timed out.
+            DeadlineExceeded: The deadline passed.
+            CircuitOpen: Cleverbot.breaker cut off the API.
+            Overloaded: Cleverbot.admission shed the request.
+            RequestTooLarge: Cleverbot.guard held the request back.
         """
+        deadline = kwargs.pop('deadline', None)
+        tracer = self.tracer
+        if tracer is None:
+            return (yield from self._say(input, kwargs, deadline=deadline))
+        with tracer.start_as_current_span('cleverbot.say') as span:
+            return (yield from self._say(input, kwargs, span, deadline))
+
+    @asyncio.coroutine
+    def _say(self, input, kwargs, span=None, deadline=None):
+        fallback = self.fallback
+        if fallback is None:
+            return (yield from self._call(input, kwargs, span, deadline))
+        deadline, budget = self._get_budget(fallback, deadline)
+        try:
+            reply = yield from self._call(input, kwargs, span, deadline,
+                                          budget)
+        except CleverbotError:
+            reply = self._fall_back(fallback, input, span)
+            if reply is None:
+                raise
+            return reply
+        fallback.record(input, reply)
+        return reply
+
+    @asyncio.coroutine
+    def _call(self, input, kwargs, span, deadline, budget=False):
+        if deadline is not None and deadline <= 0:
+            raise DeadlineExceeded(deadline)
+        admission = self.admission
+        if admission is None:
+            return (yield from self._guard(input, kwargs, span, deadline,
+                                           budget))
+        deadline = yield from admission.enter(deadline)
+        try:
+            return (yield from self._guard(input, kwargs, span, deadline,
+                                           budget))
+        finally:
+            admission.exit()
+
+    @asyncio.coroutine
+    def _guard(self, input, kwargs, span, deadline, budget=False):
+        breaker = self.breaker
+        if breaker is None:
+            return (yield from self._send(input, kwargs, span, deadline,
+                                          budget))
+        token = breaker.enter(self.key, self.url)
+        try:
+            reply = yield from self._send(input, kwargs, span, deadline,
+                                          budget)
+        except BaseException as error:
+            breaker.exit(token, error)
+            raise
+        breaker.exit(token)
+        return reply
+
+    @asyncio.coroutine
+    def _send(self, input, kwargs, span, deadline, budget=False):
         params = self._get_params(input, kwargs)
+        params = self._check_size(input, kwargs, params, span)
+        if span is not None:
+            self._trace(span, params)
+        timeouts, cut = self._get_timeouts(deadline)
+        if ClientTimeout is not None:
+            timeout = ClientTimeout(total=timeouts['total'],
+                                    connect=timeouts['connect'],
+                                    sock_read=timeouts['read'])
+        else:  # Older versions of aiohttp only have a total timeout
+            timeout = timeouts['total']
         try:
             reply = yield from self.session.get(
-                self.url, params=params, timeout=self.timeout)
-        except asyncio.TimeoutError:
-            raise Timeout(self.timeout)
+                self.url, params=params, timeout=timeout)
+        except asyncio.TimeoutError as error:
+            if isinstance(error, ConnectionTimeoutError):
+                phase = 'connect'
+            elif isinstance(error, ServerTimeoutError):
+                phase = 'read'
+            else:
+                phase = 'total'
+            if phase in cut:
+                raise self._deadline_error(deadline, phase, budget)
+            raise Timeout(timeouts[phase], phase)
+        except aiohttp.ClientError as error:
+            raise TransportError(error)
         else:
+            if span is not None:
+                span.set_attribute('http.status_code', reply.status)
             try:
                 data = yield from reply.json()
-            except ValueError as error:
+            except (ValueError, ContentTypeError) as error:
                 raise DecodeError(error)
+            except aiohttp.ClientError as error:
+                raise TransportError(error)
             else:
                 if reply.status == 200:
                     self.data = data
+                    self._touch()
                     return data.get('output')
                 else:
                     raise APIError(data.get('error'), data.get('status'))
 
+    @asyncio.coroutine
+    def submit(self, input=None, **kwargs):
+        """Talk to Cleverbot without waiting for the reply.
+
+        The request is queued in Cleverbot.pool and sent from one of its
+        tasks. A default WorkerPool is created on first use if Cleverbot.pool
+        is None. Requests to the same conversation aren't ordered, wait for the
+        previous reply if that matters.
+
+        Arguments:
+            input: The input argument is what you want to say to Cleverbot,
+                such as "hello".
+            deadline: How many seconds the request may take, including the
+                time it's queued.
+            **kwargs: Keyword arguments to pass into say.
+
+        Returns:
+            An asyncio.Future for Cleverbot's reply.
+
+        Raises:
+            QueueFull: The queue is full.
+        """
+        if self.pool is None:
+            self.pool = WorkerPool()
+        deadline = kwargs.pop('deadline', None)
+        if deadline is None:
+            return (yield from self.pool.submit(self.say, input, **kwargs))
+
+        expires = clock() + deadline
+
+        @asyncio.coroutine
+        def say():
+            remaining = expires - clock()
+            if remaining <= 0:
+                raise DeadlineExceeded(deadline)
+            return (yield from self.say(input, deadline=remaining, **kwargs))
+        return (yield from self.pool.submit(say))
+
+    def chat(self, inputs, **kwargs):
+        """Talk to Cleverbot one input after the other.
+
+        Arguments:
+            inputs: An iterable or asynchronous iterable of what to say to
+                Cleverbot. It's consumed lazily.
+            **kwargs: Keyword arguments to pass into say.
+
+        Returns:
+            An asynchronous iterator of Cleverbot's replies.
+        """
+        return Chat(self, inputs, kwargs)
+
 
 class Cleverbot(SayMixin, CleverbotBase):
     """An asynchronous Cleverbot API wrapper."""
 
-    def __init__(self, *args, loop=None, **kwargs):
+    _transient = CleverbotBase._transient + ('_loop',)
+
+    def __init__(self, *args, loop=None, session=None, shared=False,
+                 **kwargs):
         """Initialize Cleverbot with the given arguments.
 
         Arguments:
@@ -62,13 +216,47 @@ class Cleverbot(SayMixin, CleverbotBase):
                 conversation history up to that point.
             timeout: How many seconds to wait for the API to respond before
                 giving up and raising an error.
-            loop: The event loop used for the asynchronous requests.
+            connect_timeout: How many seconds to wait for a connection to the
+                API. Defaults to timeout.
+            read_timeout: How many seconds to wait between receiving parts of
+                the reply. Defaults to timeout.
+            loop: The event loop used for the asynchronous requests. If None
+                the session is created in the loop running when Cleverbot
+                first talks, so Cleverbot can be made before there's a loop.
+            session: An aiohttp.ClientSession to send the requests with
+                instead of creating one. It's left open when Cleverbot is
+                closed.
+            shared: A SharedSession to send the requests with, or True to
+                share the process-wide default_session with every other
+                Cleverbot that does. It's only closed once every Cleverbot
+                sharing it is.
         """
+        if session is not None and shared:
+            raise TypeError("Supplied both 'session' and 'shared'")
         super().__init__(*args, **kwargs)
-        loop = asyncio.get_event_loop() if loop is None else loop
-        headers = {'User-Agent': 'cleverbot.py/' + __version__ + ' '
-                   '(+https://github.com/orlnub123/cleverbot.py)'}
-        self.session = aiohttp.ClientSession(loop=loop, headers=headers)
+        self._loop = loop
+        if session is not None:
+            self._session = session
+        elif shared:
+            self._shared = default_session if shared is True else shared
+
+    def _setup(self):
+        super()._setup()
+        self._loop = None
+
+    @asyncio.coroutine
+    def __aenter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __aexit__(self, exc_type, exc_value, traceback):
+        yield from self.close()
+
+    def _create_session(self):
+        if self._shared is not None:
+            return self._shared.acquire(self._loop)
+        self._owns_session = True
+        return create_session(self._loop)
 
     def conversation(self, name=None, **kwargs):
         """Make a new conversation.
@@ -87,10 +275,122 @@ class Cleverbot(SayMixin, CleverbotBase):
         super().conversation(name, convo)
         return convo
 
+    def conversations_from(self, records):
+        """Make many conversations at once.
+
+        Arguments:
+            records: An iterable of (name, cs, key, timeout, tweaks) tuples
+                where tweaks is a tuple of tweak1, tweak2 and tweak3 or None.
+                The timeout may also be a tuple of timeout, connect_timeout
+                and read_timeout.
+                Like with Cleverbot.conversation, values that are None will be
+                taken from Cleverbot and a name of None makes a nameless
+                conversation.
+
+        Returns:
+            A list of the new conversations.
+        """
+        return super().conversations_from(records, Conversation)
+
+    def chat_many(self, streams, concurrency=8, **kwargs):
+        """Chat in many conversations at once.
+
+        Every conversation is chatted in by a single task so its inputs are
+        said in order, while up to concurrency conversations are chatted in at
+        once over Cleverbot's session. The streams and their inputs are
+        consumed lazily.
+
+        Arguments:
+            streams: A dictionary or an iterable of pairs of a conversation and
+                an iterable or asynchronous iterable of what to say in it.
+            concurrency: How many conversations to chat in at once.
+            **kwargs: Keyword arguments to pass into say.
+
+        Returns:
+            An asynchronous iterator of tuples of the conversation, the input
+            and Cleverbot's reply in the order the replies arrive. If saying
+            something fails the error is raised from it and chatting is
+            stopped. Chatting is also stopped once it's closed with aclose or
+            garbage collected, such as after breaking out of async for.
+        """
+        return ChatMany(streams, concurrency, kwargs)
+
+    @asyncio.coroutine
+    def warmup(self, connections=1, refresh=None):
+        """Resolve the API's host and open connections to it ahead of time so
+        that the first requests don't have to.
+
+        Arguments:
+            connections: How many connections to open and keep alive.
+            refresh: If not None, how many seconds to wait between warming up
+                again in a background task, replacing the connections that
+                were closed in the meantime. Set it below the keep-alive
+                timeout of both the API and the session's connector.
+
+        Returns:
+            How many seconds warming up took.
+        """
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        url = urlsplit(self.url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        yield from loop.getaddrinfo(url.hostname, port,
+                                    type=socket.SOCK_STREAM)
+
+        # Hold every response open until all of them are in so that each one
+        # gets a connection of its own
+        responses = yield from asyncio.gather(
+            *[self.session.head(self.url, timeout=self.timeout)
+              for _ in range(connections)], return_exceptions=True)
+        errors = []
+        for response in responses:
+            if isinstance(response, Exception):
+                errors.append(response)
+            else:
+                response.release()
+        if errors:
+            if isinstance(errors[0], asyncio.TimeoutError):
+                raise Timeout(self.timeout)
+            raise errors[0]
+
+        if refresh is not None and self._warmer is None:
+            self._warmer = asyncio.ensure_future(
+                self._rewarm(connections, refresh))
+        return loop.time() - start
+
+    @asyncio.coroutine
+    def _rewarm(self, connections, refresh):
+        while True:
+            yield from asyncio.sleep(refresh)
+            try:
+                yield from self.warmup(connections)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # Try again next time
+                pass
+
     @asyncio.coroutine
     def close(self):
-        """Close Cleverbot's connection to the API."""
-        yield from self.session.close()
+        """Close Cleverbot's connection to the API after sending the
+        submitted requests. Talking again afterwards creates a new session in
+        the loop running at the time.
+        """
+        if self._warmer is not None:
+            self._warmer.cancel()
+            self._warmer = None
+        if self.pool is not None:
+            yield from self.pool.shutdown()
+            self.pool = None
+        session = self._session
+        if session is None:
+            return
+        if self._shared is not None:
+            self._session = None
+            yield from self._shared.release()
+        elif self._owns_session:
+            self._session = None
+            self._owns_session = False
+            yield from session.close()
 
 
 class Conversation(SayMixin, ConversationBase):
@@ -98,4 +398,112 @@ class Conversation(SayMixin, ConversationBase):
     __slots__ = ()
 
 
+class Chat(object):
+    """Asynchronous iterator returned from chat."""
+
+    def __init__(self, convo, inputs, kwargs):
+        self.convo = convo
+        self.kwargs = kwargs
+        self.input = None
+        if hasattr(inputs, '__aiter__'):
+            self._inputs = inputs.__aiter__()
+            self._async = True
+        else:
+            self._inputs = iter(inputs)
+            self._async = False
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        if self._async:
+            input = yield from self._inputs.__anext__()
+        else:
+            try:
+                input = next(self._inputs)
+            except StopIteration:
+                raise StopAsyncIteration
+        self.input = input
+        return (yield from self.convo.say(input, **self.kwargs))
+
+
+class ChatMany(object):
+    """Asynchronous iterator returned from chat_many."""
+
+    def __init__(self, streams, concurrency, kwargs):
+        if isinstance(streams, dict):
+            streams = streams.items()
+        self.concurrency = concurrency
+        self.kwargs = kwargs
+        self._streams = iter(streams)
+        self._results = None
+        self._tasks = []
+        self._running = 0
+
+    def __del__(self):
+        try:
+            self.cancel()
+        except RuntimeError:  # The loop is already closed
+            pass
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        if self._results is None:
+            self._results = asyncio.Queue(self.concurrency)
+            # The tasks mustn't keep the iterator alive so that it can cancel
+            # them once it's dropped
+            self._tasks = [
+                asyncio.ensure_future(self._work(
+                    self._streams, self._results, self.kwargs))
+                for _ in range(self.concurrency)]
+            self._running = self.concurrency
+
+        while self._running:
+            result = yield from self._results.get()
+            if result is None:
+                self._running -= 1
+                continue
+
+            convo, input, reply, error = result
+            if error is not None:
+                self.cancel()
+                raise error
+            return convo, input, reply
+        raise StopAsyncIteration
+
+    def cancel(self):
+        """Stop chatting."""
+        self._running = 0
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+
+    @asyncio.coroutine
+    def aclose(self):
+        """Stop chatting and wait for the conversations to stop."""
+        self.cancel()
+        if self._tasks:
+            yield from asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @staticmethod
+    @asyncio.coroutine
+    def _work(streams, results, kwargs):
+        for convo, inputs in streams:
+            chat = Chat(convo, inputs, kwargs)
+            while True:
+                try:
+                    reply = yield from chat.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception as error:
+                    yield from results.put((convo, chat.input, None, error))
+                    return
+                yield from results.put((convo, chat.input, reply, None))
+        yield from results.put(None)
+
+
 load = functools.partial(load, __name__)
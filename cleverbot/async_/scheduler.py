@@ -0,0 +1,78 @@
+import asyncio
+import heapq
+
+from ..errors import DeadlineExceeded
+from ..scheduler import SchedulerBase, clock
+
+
+class Scheduler(SchedulerBase):
+    """Limit how many requests are in flight at once and send the queued ones
+    by priority and deadline.
+
+    Requests are sent in order of priority and requests of the same priority
+    earliest deadline first. Requests whose deadline passes while they're
+    waiting are dropped without being sent.
+    """
+
+    @asyncio.coroutine
+    def say(self, convo, input=None, priority=0, deadline=None, **kwargs):
+        """Talk to Cleverbot once it's the request's turn.
+
+        Arguments:
+            convo: The Cleverbot or conversation to talk to.
+            input: What to say to Cleverbot.
+            priority: Requests with a higher priority are sent first.
+            deadline: How many seconds the request may take. It's dropped if
+                it's still waiting to be sent by then, and whatever is left
+                of it bounds the request itself.
+            **kwargs: Keyword arguments to pass into say.
+
+        Returns:
+            Cleverbot's reply.
+
+        Raises:
+            DeadlineExceeded: The deadline passed before the request was sent.
+        """
+        expires = None if deadline is None else clock() + deadline
+        entry = self._entry(priority, expires)
+        if not self._queue and self.active < self.concurrency:
+            self.active += 1
+            self._dispatch(entry)
+        else:
+            future = asyncio.Future()
+            entry.append(future)
+            heapq.heappush(self._queue, entry)
+            try:
+                yield from asyncio.wait_for(future, deadline)
+            except asyncio.TimeoutError:
+                self.expired += 1
+                raise DeadlineExceeded(deadline)
+            except BaseException:
+                if (future.done() and not future.cancelled() and
+                        future.exception() is None):
+                    # The slot was handed over just before getting cancelled
+                    self._release()
+                raise
+
+        if expires is not None:
+            kwargs['deadline'] = expires - clock()
+        try:
+            return (yield from convo.say(input, **kwargs))
+        finally:
+            self._release()
+
+    def _release(self):
+        """Hand the slot over to the next request in line."""
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            future = entry[-1]
+            if future.done():  # Timed out or cancelled
+                continue
+            if clock() >= entry[1]:
+                self.expired += 1
+                future.set_exception(DeadlineExceeded())
+                continue
+            self._dispatch(entry)
+            future.set_result(None)
+            return
+        self.active -= 1
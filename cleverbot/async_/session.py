@@ -0,0 +1,50 @@
+import asyncio
+
+import aiohttp
+
+from ..session import HEADERS, SharedSessionBase
+
+
+def create_session(loop=None):
+    """Create a session set up to talk to the API in the given loop, or in
+    the running one if None.
+    """
+    if loop is None:
+        return aiohttp.ClientSession(headers=HEADERS)
+    return aiohttp.ClientSession(loop=loop, headers=HEADERS)
+
+
+class SharedSession(SharedSessionBase):
+    """A session shared by many asynchronous Cleverbots.
+
+    The session is created in the loop of the first Cleverbot that acquires it
+    and closed once the last one releases it, so closing one Cleverbot doesn't
+    break the others. Pass it into Cleverbot as shared, or pass shared=True to
+    use the process-wide default_session.
+    """
+
+    def __init__(self, factory=create_session):
+        """Initialize the shared session.
+
+        Arguments:
+            factory: A callable that takes the event loop and creates the
+                aiohttp.ClientSession to share.
+        """
+        super().__init__()
+        self.factory = factory
+
+    def acquire(self, loop=None):
+        """Get the session, creating it in the loop (or the running one if
+        None) if necessary, and take a reference to it.
+        """
+        return self._acquire(lambda: self.factory(loop))
+
+    @asyncio.coroutine
+    def release(self):
+        """Drop a reference to the session, closing it after the last one."""
+        session = self._release()
+        if session is not None:
+            yield from session.close()
+
+
+default_session = SharedSession()
@@ -0,0 +1,153 @@
+import asyncio
+import functools
+import inspect
+import threading
+
+from .cleverbot import Cleverbot
+
+
+class Proxy(object):
+    """Forward attribute access to the wrapped asynchronous object.
+
+    Coroutine functions are run on the loop and methods are called from the
+    loop's thread, both blocking until they're done. Everything else is
+    forwarded as it is.
+    """
+
+    def __init__(self, cleverbot, target):
+        object.__setattr__(self, '_cleverbot', cleverbot)
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if asyncio.iscoroutinefunction(value):
+            @functools.wraps(value)
+            def run(*args, **kwargs):
+                return self._cleverbot._run(value(*args, **kwargs))
+            return run
+        if inspect.ismethod(value):
+            @functools.wraps(value)
+            def call(*args, **kwargs):
+                return self._cleverbot._call(value, *args, **kwargs)
+            return call
+        return value
+
+    def __setattr__(self, attr, value):
+        self._cleverbot._call(setattr, self._target, attr, value)
+
+    def __delattr__(self, attr):
+        self._cleverbot._call(delattr, self._target, attr)
+
+    def say(self, input=None, **kwargs):
+        """Talk to Cleverbot and wait for the reply. Takes the same arguments
+        as Cleverbot.say.
+        """
+        return self._cleverbot._run(self._target.say(input, **kwargs))
+
+    def submit(self, input=None, **kwargs):
+        """Talk to Cleverbot without waiting for the reply. Takes the same
+        arguments as Cleverbot.submit.
+
+        Returns:
+            A concurrent.futures.Future for Cleverbot's reply.
+
+        Raises:
+            QueueFull: The queue is full.
+        """
+        future = self._cleverbot._run(self._target.submit(input, **kwargs))
+
+        @asyncio.coroutine
+        def wait():
+            return (yield from future)
+        return asyncio.run_coroutine_threadsafe(wait(), self._cleverbot._loop)
+
+    def reset(self):
+        self._cleverbot._call(self._target.reset)
+
+
+class ThreadedCleverbot(Proxy):
+    """A synchronous Cleverbot that runs the asynchronous one on an event loop
+    in a background thread.
+
+    Blocking calls are handed over to the loop so many threads can share its
+    connection pool, and ThreadedCleverbot.say_many sends many requests
+    concurrently without the caller needing an event loop of its own.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize Cleverbot with the given arguments. These accept the
+        same arguments as the asynchronous Cleverbot except for loop.
+        """
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.daemon = True
+        thread.start()
+        object.__setattr__(self, '_loop', loop)
+        object.__setattr__(self, '_thread', thread)
+        kwargs['loop'] = loop
+        super().__init__(self, self._call(Cleverbot, *args, **kwargs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def cleverbot(self):
+        """The wrapped asynchronous Cleverbot."""
+        return self._target
+
+    def _run(self, coro):
+        """Run the coroutine on the loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _call(self, func, *args, **kwargs):
+        """Call the function from the loop's thread and wait for its
+        result.
+        """
+        @asyncio.coroutine
+        def call():
+            return func(*args, **kwargs)
+        return self._run(call())
+
+    def conversation(self, name=None, **kwargs):
+        """Make a new conversation. Takes the same arguments as
+        Cleverbot.conversation.
+
+        Returns:
+            The new conversation with a blocking say.
+        """
+        convo = self._call(self._target.conversation, name, **kwargs)
+        return Proxy(self, convo)
+
+    def say_many(self, requests, return_exceptions=False):
+        """Talk to Cleverbot concurrently.
+
+        Arguments:
+            requests: An iterable of pairs of a conversation (or Cleverbot)
+                and what to say in it.
+            return_exceptions: Whether to put the errors in the returned list
+                instead of raising the first one.
+
+        Returns:
+            A list of the replies in the order of the requests.
+        """
+        coros = [convo._target.say(input) for convo, input in requests]
+
+        @asyncio.coroutine
+        def gather():
+            return (yield from asyncio.gather(
+                *coros, return_exceptions=return_exceptions))
+        return self._run(gather())
+
+    def close(self):
+        """Close Cleverbot's connection to the API and stop the loop."""
+        if self._loop.is_closed():
+            return
+        try:
+            self._run(self._target.close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
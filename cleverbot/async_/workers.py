@@ -0,0 +1,113 @@
+import asyncio
+
+from ..errors import QueueFull
+
+
+class WorkerPool(object):
+    """A fixed number of tasks that serve requests from a bounded queue.
+
+    What happens when the queue is full depends on the overflow policy:
+    ``'block'`` waits for room (up to ``timeout`` seconds), ``'raise'`` raises
+    QueueFull right away and ``'shed'`` drops the oldest queued request,
+    failing it with QueueFull, to make room for the new one.
+    """
+
+    def __init__(self, workers=4, maxsize=100, overflow='block',
+                 timeout=None):
+        """Initialize the pool with the given arguments.
+
+        Arguments:
+            workers: How many tasks to serve the requests with.
+            maxsize: How many requests can be queued at once.
+            overflow: What to do when the queue is full, either 'block',
+                'raise' or 'shed'.
+            timeout: How many seconds to wait for room when blocking before
+                raising QueueFull. If None wait indefinitely.
+        """
+        if overflow not in ('block', 'raise', 'shed'):
+            raise ValueError("Unknown overflow policy {!r}".format(overflow))
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.timeout = timeout
+        self._queue = None
+        self._tasks = []
+        self._shutdown = False
+
+    @property
+    def queued(self):
+        """How many requests are waiting to be served."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @asyncio.coroutine
+    def submit(self, func, *args, **kwargs):
+        """Queue a call to the coroutine function func with the given
+        arguments.
+
+        Returns:
+            An asyncio.Future for the result of the call.
+
+        Raises:
+            QueueFull: The queue is full.
+        """
+        if self._shutdown:
+            raise RuntimeError("Can't submit to a pool that's shut down")
+        if self._queue is None:
+            self._start()
+
+        future = asyncio.Future()
+        item = (future, func, args, kwargs)
+        if self.overflow == 'block':
+            try:
+                yield from asyncio.wait_for(
+                    self._queue.put(item), self.timeout)
+            except asyncio.TimeoutError:
+                raise QueueFull("Timed out waiting for room in the queue")
+        elif self.overflow == 'raise':
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                raise QueueFull("The queue is full")
+        else:
+            if self._queue.full():
+                dropped = self._queue.get_nowait()[0]
+                if not dropped.done():
+                    dropped.set_exception(QueueFull(
+                        "Dropped to make room for a newer request"))
+            self._queue.put_nowait(item)
+        return future
+
+    @asyncio.coroutine
+    def shutdown(self):
+        """Stop the tasks after the queued requests have been served."""
+        if self._shutdown:
+            return
+        self._shutdown = True
+        for _ in self._tasks:
+            yield from self._queue.put(None)
+        if self._tasks:
+            yield from asyncio.wait(self._tasks)
+
+    def _start(self):
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.ensure_future(self._work())
+                       for _ in range(self.workers)]
+
+    @asyncio.coroutine
+    def _work(self):
+        while True:
+            item = yield from self._queue.get()
+            if item is None:
+                return
+
+            future, func, args, kwargs = item
+            if future.done():
+                continue
+            try:
+                result = yield from func(*args, **kwargs)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
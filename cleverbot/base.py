@@ -1,7 +1,14 @@
+import collections
+import copy
 import pickle
+import threading
 import weakref
 
-from .migrations import migratable
+from .columns import export_columns, import_columns
+from .errors import BudgetExceeded, DeadlineExceeded
+from .guard import RESET, encoded_size
+from .index import IndexedFile, save_indexed
+from .migrations import batch, migratable
 from .utils import (GenericUnpickler, convo_property, ensure_file, get_slots,
                     keyword_only)
 
@@ -27,35 +34,97 @@ class AttributeMixin(object):
     @cs.setter
     def cs(self, value):
         self.data['cs'] = value
+        self._touch()
 
     @cs.deleter
     def cs(self):
         self.data.pop('cs', None)
+        self._touch()
 
 
 @migratable
 class CleverbotBase(AttributeMixin):
     """Base class for Cleverbot."""
 
+    # Attributes that are set up again instead of being pickled
+    _transient = ('pool', 'tracer', 'breaker', 'fallback', 'admission',
+                  'guard', 'request_size', 'generation', 'modified',
+                  '_changes', '_changes_lock', '_forgotten', '_revision',
+                  '_template', '_warmer', '_session', '_shared',
+                  '_owns_session')
+
+    # Guards the lazy creation of the sessions
+    _session_lock = threading.Lock()
+
+    # Defaults for Cleverbots pickled before these existed
+    connect_timeout = None
+    read_timeout = None
+
     @keyword_only('cs')
     def __init__(self, key, cs=None, timeout=None, tweak1=None, tweak2=None,
-                 tweak3=None):
+                 tweak3=None, connect_timeout=None, read_timeout=None):
+        self._setup()
         self.key = key
         self.data = {}
         if cs is not None:
             self.data['cs'] = cs
         self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
         self.tweak1 = tweak1
         self.tweak2 = tweak2
         self.tweak3 = tweak3
         self.conversations = None
 
+    def _setup(self):
+        """Set up the attributes that aren't pickled."""
+        self._revision = 0
+        self._template = None
+        self._session = None
+        self._shared = None
+        self._owns_session = False
+        self.pool = None
+        self.tracer = None
+        self.breaker = None
+        self.fallback = None
+        self.admission = None
+        self.guard = None
+        self.request_size = None
+        self._warmer = None
+        self.generation = 0
+        self.modified = 0
+        self._changes = collections.OrderedDict()
+        self._changes_lock = threading.Lock()
+        # Garbage collected conversations, dropped from the changes under the
+        # lock since the weakref callbacks can run at any time
+        self._forgotten = []
+
+    @property
+    def session(self):
+        """The session the requests are sent with. It's created on first use
+        so unpickled and unused Cleverbots don't hold any connections.
+        """
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                session = self._session
+                if session is None:
+                    session = self._session = self._create_session()
+        return session
+
+    @session.setter
+    def session(self, value):
+        self._session = value
+        self._shared = None
+        self._owns_session = False
+
     def __getstate__(self):
         state = vars(self).copy()
         convos = self.conversations
         if isinstance(convos, weakref.WeakSet):
             state['conversations'] = set(convos)
-        del state['session']
+        for item in self._transient:
+            state.pop(item, None)
         return state
 
     def __setstate__(self, state):
@@ -63,19 +132,134 @@ class CleverbotBase(AttributeMixin):
         if isinstance(convos, set):
             state['conversations'] = weakref.WeakSet(convos)
 
-        self.__init__(None)  # Set the session
+        self._setup()
         vars(self).update(state)
         if convos is None:
             return
 
         if isinstance(convos, dict):
-            convos = convos.values()
-        for convo in convos:
-            convo.session = self.session
+            for name, convo in convos.items():
+                convo.name = name
+        else:
+            for convo in convos:
+                convo.name = None
+
+    def __setattr__(self, attr, value):
+        super(CleverbotBase, self).__setattr__(attr, value)
+        if attr in ('key', 'tweak1', 'tweak2', 'tweak3'):
+            # Invalidate the request templates of Cleverbot and its
+            # conversations
+            self._revision += 1
 
     def __copy__(self):
         cleverbot = self.__new__(type(self))
         vars(cleverbot).update(vars(self))
+        cleverbot._changes = collections.OrderedDict()
+        cleverbot._changes_lock = threading.Lock()
+        cleverbot._forgotten = []
+        return cleverbot
+
+    def _forget(self):
+        """Drop the garbage collected conversations from the changes. Must be
+        called with the changes lock held.
+        """
+        forgotten = self._forgotten
+        changes = self._changes
+        while forgotten:
+            changes.pop(forgotten.pop(), None)
+
+    def _touch(self, convo=None):
+        """Record a change to Cleverbot or to one of its conversations."""
+        with self._changes_lock:
+            self.generation += 1
+            generation = self.generation
+            if convo is None:
+                self.modified = generation
+                return
+
+            convo.modified = generation
+            self._forget()
+            changes = self._changes
+            ref = weakref.ref(convo, self._forgotten.append)
+            changes.pop(ref, None)
+            changes[ref] = generation
+
+    def changes(self, since=0):
+        """Get the conversations that changed after the given generation.
+
+        Saying something, resetting and changing the cleverbot state or any of
+        the settings of a conversation counts as a change. Changes to
+        Cleverbot's own data are recorded in Cleverbot.modified instead.
+
+        Arguments:
+            since: The generation to get the changes after. Store
+                Cleverbot.generation as a marker to later get everything that
+                changed since then.
+
+        Returns:
+            A list of the changed conversations ordered from the least to the
+            most recently changed.
+        """
+        refs = []
+        with self._changes_lock:
+            self._forget()
+            changes = self._changes
+            for ref in reversed(changes):
+                if changes[ref] <= since:
+                    break
+                refs.append(ref)
+        convos = []
+        for ref in reversed(refs):
+            convo = ref()
+            if convo is not None:
+                convos.append(convo)
+        return convos
+
+    def clear_changes(self, until=None):
+        """Stop keeping track of the conversations that changed.
+
+        Arguments:
+            until: The generation to clear the changes up to, inclusive. If
+                None all of the changes are cleared.
+        """
+        with self._changes_lock:
+            changes = self._changes
+            if until is None:
+                changes.clear()
+                return
+
+            self._forget()
+            while changes:
+                ref = next(iter(changes))
+                if changes[ref] > until:
+                    break
+                del changes[ref]
+
+    def snapshot(self):
+        """Make a point-in-time copy of Cleverbot and all of its conversations
+        that can be saved while the original keeps on talking.
+
+        Returns:
+            The copied Cleverbot.
+        """
+        cleverbot = copy.copy(self)
+        cleverbot.data = self.data.copy()
+        convos = self.conversations
+        if convos is None:
+            return cleverbot
+
+        def copy_convo(convo):
+            convo = copy.copy(convo)
+            convo.cleverbot = cleverbot
+            convo.data = convo.data.copy()
+            return convo
+
+        if isinstance(convos, dict):
+            cleverbot.conversations = {name: copy_convo(convo)
+                                       for name, convo in list(convos.items())}
+        else:
+            # Keep the copies alive, pickling turns them into a set anyway
+            cleverbot.conversations = set(map(copy_convo, list(convos)))
         return cleverbot
 
     def conversation(self, name, convo):
@@ -92,10 +276,85 @@ class CleverbotBase(AttributeMixin):
             message = "Can't mix nameless conversations with named ones"
             assert isinstance(self.conversations, weakref.WeakSet), message
             self.conversations.add(convo)
+        convo.name = name
+        self._touch(convo)
+
+    def conversations_from(self, records, cls):
+        """Make many conversations of the given class at once from records of
+        (name, cs, key, timeout, tweaks), skipping the per-conversation setup
+        of Cleverbot.conversation.
+        """
+        new = cls.__new__
+        named = {}
+        nameless = False
+        created = []
+        for name, cs, key, timeout, tweaks in records:
+            convo = new(cls)
+            convo.cleverbot = self
+            convo.name = name
+            convo.data = {'cs': cs} if cs is not None else {}
+            convo._template = None
+            convo.request_size = None
+            if key is not None:
+                convo._key = key
+            if isinstance(timeout, tuple):
+                timeout, connect_timeout, read_timeout = timeout
+                if connect_timeout is not None:
+                    convo._connect_timeout = connect_timeout
+                if read_timeout is not None:
+                    convo._read_timeout = read_timeout
+            if timeout is not None:
+                convo._timeout = timeout
+            if tweaks is not None:
+                tweak1, tweak2, tweak3 = tweaks
+                if tweak1 is not None:
+                    convo._tweak1 = tweak1
+                if tweak2 is not None:
+                    convo._tweak2 = tweak2
+                if tweak3 is not None:
+                    convo._tweak3 = tweak3
+            if name is not None:
+                if name in named:
+                    raise ValueError("Duplicate conversation name {!r}"
+                                     .format(name))
+                named[name] = convo
+            else:
+                nameless = True
+            created.append(convo)
+        if not created:
+            return created
+
+        # Nothing is changed until the records are known to fit in
+        convos = self.conversations
+        if named and nameless:
+            raise ValueError("Can't mix named conversations with nameless "
+                             "ones")
+        if named and not (convos is None or isinstance(convos, dict)):
+            raise TypeError("Can't mix named conversations with nameless ones")
+        if nameless and not (convos is None or
+                             isinstance(convos, weakref.WeakSet)):
+            raise TypeError("Can't mix nameless conversations with named ones")
+
+        with self._changes_lock:
+            self.generation += 1
+            generation = self.generation
+            changes = self._changes
+            forget = self._forgotten.append
+            for convo in created:
+                convo.modified = generation
+                changes[weakref.ref(convo, forget)] = generation
+        if convos is None:
+            self.conversations = named or weakref.WeakSet(created)
+        elif named:
+            convos.update(named)
+        else:
+            convos.update(created)
+        return created
 
     def reset(self):
         """Reset Cleverbot's stored data and all of its conversations."""
         self.data = {}
+        self._touch()
         convos = self.conversations
         if convos is None:
             return
@@ -116,6 +375,73 @@ class CleverbotBase(AttributeMixin):
         with ensure_file(file, 'wb') as file:
             pickle.dump(self, file, pickle.HIGHEST_PROTOCOL)
 
+    def save_indexed(self, file):
+        """Save Cleverbot and all of its conversations into the specified file
+        along with an index so that a single conversation can later be
+        restored without reading the rest. Only named conversations can be
+        saved this way.
+
+        Arguments:
+            file: A filename or a file object that accepts bytes to save the
+                data to.
+        """
+        save_indexed(self, file)
+
+    def export_columns(self, file):
+        """Save the conversations of Cleverbot as columns, one contiguous
+        buffer per field, for analytics or for quickly making them again with
+        Cleverbot.import_columns. Only the settings a conversation overrides
+        are saved along with its name, cleverbot state and last output.
+
+        Arguments:
+            file: A filename or a file object that accepts bytes to save the
+                columns to.
+
+        Raises:
+            TypeError: A conversation is named with something other than a
+                string.
+        """
+        export_columns(self, file)
+
+    def import_columns(self, file):
+        """Make conversations from a file saved with Cleverbot.export_columns
+        and add them to Cleverbot's conversations.
+
+        Arguments:
+            file: The filename, file object or an already opened ColumnFile to
+                read the columns from.
+
+        Returns:
+            A list of the new conversations.
+        """
+        return import_columns(self, file)
+
+    def restore(self, file, name):
+        """Restore a single conversation from a file saved with
+        Cleverbot.save_indexed, replacing the conversation with the same name.
+
+        Arguments:
+            file: The filename, file object or an already opened IndexedFile
+                to restore the conversation from.
+            name: The name of the conversation to restore.
+
+        Returns:
+            The restored conversation.
+
+        Raises:
+            KeyError: The conversation isn't in the file.
+        """
+        if not isinstance(file, IndexedFile):
+            with IndexedFile(file) as file:
+                return self.restore(file, name)
+
+        state = file.read(name, module=type(self).__module__)
+        convo = self.conversation(name)
+        convo.__setstate__(state)
+        convo.name = name
+        self._touch(convo)
+        return convo
+
     def load(self, file):
         """Load and replace Cleverbot's conversations with the previously saved
         conversations from the file.
@@ -126,6 +452,8 @@ class CleverbotBase(AttributeMixin):
         """
         cleverbot = load(type(self).__module__, file)
         self.data = cleverbot.data
+        self._touch()
+        self.clear_changes()
         convos = cleverbot.conversations
         self.conversations = convos
         if convos is None:
@@ -135,38 +463,55 @@ class CleverbotBase(AttributeMixin):
             convos = convos.values()
         for convo in convos:
             convo.cleverbot = self
-            convo.session = self.session
+            self._touch(convo)
 
 
-@migratable
+@migratable(batched=True)
 class ConversationBase(AttributeMixin):
     """Base class for Conversation."""
 
-    __slots__ = ('__weakref__', 'cleverbot', 'data', '_key', '_timeout',
-                 '_tweak1', '_tweak2', '_tweak3', 'session')
+    __slots__ = ('__weakref__', 'cleverbot', 'name', 'data', '_key',
+                 '_timeout', '_connect_timeout', '_read_timeout', '_tweak1',
+                 '_tweak2', '_tweak3', '_url', 'modified', '_template',
+                 'request_size')
 
+    url = convo_property('url')
     key = convo_property('key')
     timeout = convo_property('timeout')
+    connect_timeout = convo_property('connect_timeout')
+    read_timeout = convo_property('read_timeout')
     tweak1 = convo_property('tweak1')
     tweak2 = convo_property('tweak2')
     tweak3 = convo_property('tweak3')
 
     @keyword_only('key')
     def __init__(self, cleverbot, key=None, cs=None, timeout=None, tweak1=None,
-                 tweak2=None, tweak3=None):
+                 tweak2=None, tweak3=None, connect_timeout=None,
+                 read_timeout=None):
         self.cleverbot = cleverbot
+        self.name = None
         self.data = {}
-        for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
+        self.modified = 0
+        self._template = None
+        self.request_size = None
+        for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3',
+                     'connect_timeout', 'read_timeout'):
             value = locals()[item]
             if value is not None:
                 setattr(self, item, value)
-        self.session = cleverbot.session
 
     def __getstate__(self):
+        # The name is restored from the conversations of Cleverbot
         return {item: getattr(self, item) for item in get_slots(type(self))
-                if hasattr(self, item) and item != 'session'}
+                if hasattr(self, item) and
+                item not in ('name', 'modified', '_template',
+                             'request_size')}
 
     def __setstate__(self, state):
+        self.name = None
+        self.modified = 0
+        self._template = None
+        self.request_size = None
         for item, value in state.items():
             setattr(self, item, value)
 
@@ -177,24 +522,184 @@ class ConversationBase(AttributeMixin):
                 setattr(convo, item, getattr(self, item))
         return convo
 
+    @property
+    def session(self):
+        return self.cleverbot.session
+
+    @property
+    def pool(self):
+        return self.cleverbot.pool
+
+    @property
+    def tracer(self):
+        return self.cleverbot.tracer
+
+    @property
+    def breaker(self):
+        return self.cleverbot.breaker
+
+    @property
+    def fallback(self):
+        return self.cleverbot.fallback
+
+    @property
+    def admission(self):
+        return self.cleverbot.admission
+
+    @property
+    def guard(self):
+        return self.cleverbot.guard
+
+    @pool.setter
+    def pool(self, value):
+        self.cleverbot.pool = value
+
+    @property
+    def _revision(self):
+        return self.cleverbot._revision
+
+    def _touch(self):
+        self.cleverbot._touch(self)
+
     def reset(self):
         self.data = {}
+        self._touch()
 
 
 class SayMixinBase(object):
 
     __slots__ = ()
 
-    def _get_params(self, input, kwargs):
+    def _get_template(self):
+        """Get the request parameters that only change with the settings."""
         params = {
             'key': self.key,
-            'input': input,
-            'cs': self.data.get('cs'),
             'cb_settings_tweak1': self.tweak1,
             'cb_settings_tweak2': self.tweak2,
             'cb_settings_tweak3': self.tweak3,
             'wrapper': 'cleverbot.py'
         }
+        # aiohttp doesn't filter None values
+        return {key: value for key, value in params.items()
+                if value is not None}
+
+    def _get_timeouts(self, deadline=None):
+        """Get the connect, read and total timeouts of a request along with
+        the phases the remaining deadline cuts short.
+
+        The connect and read timeouts fall back to the total timeout.
+        """
+        total = self.timeout
+        connect = self.connect_timeout
+        read = self.read_timeout
+        if connect is None:
+            connect = total
+        if read is None:
+            read = total
+        timeouts = {'connect': connect, 'read': read, 'total': total}
+        cut = set()
+        if deadline is not None:
+            for phase, timeout in timeouts.items():
+                if timeout is None or deadline < timeout:
+                    timeouts[phase] = deadline
+                    cut.add(phase)
+        return timeouts, cut
+
+    def _get_budget(self, fallback, deadline):
+        """Cut the deadline short to the latency budget of the fallback.
+
+        Returns:
+            The deadline and whether the budget cut it short.
+        """
+        budget = fallback.budget
+        if budget is not None and (deadline is None or budget < deadline):
+            return budget, True
+        return deadline, False
+
+    @staticmethod
+    def _deadline_error(deadline, phase, budget=False):
+        """Make the error for a deadline that passed in the given phase."""
+        if budget:
+            return BudgetExceeded(deadline, phase)
+        return DeadlineExceeded(deadline, phase)
+
+    def _fall_back(self, fallback, input, span):
+        """Get a degraded reply from the fallback, or None if it has none."""
+        reply = fallback.reply(input)
+        if reply is not None and span is not None:
+            span.set_attribute('cleverbot.degraded', True)
+        return reply
+
+    def _get_request_size(self, params, kwargs):
+        """Get the length of the URL the request is sent to."""
+        # The URL, '?', and '=' and '&' (or the end) for every parameter
+        if kwargs:
+            return len(self.url) + sum(
+                encoded_size(key) + encoded_size(value) + 2
+                for key, value in params.items())
+
+        # Without keyword arguments only the input and the cleverbot state
+        # differ from the template
+        template = self._template
+        size = template[2]
+        if size is None:
+            size = template[2] = sum(
+                encoded_size(key) + encoded_size(value) + 2
+                for key, value in template[1].items())
+        size += len(self.url)
+        for key in ('input', 'cs'):
+            value = params.get(key)
+            if value is not None:
+                size += len(key) + encoded_size(value) + 2
+        return size
+
+    def _check_size(self, input, kwargs, params, span):
+        """Measure the request and hold it up against Cleverbot.guard,
+        rolling over to a fresh state if it says so. Requests are only
+        measured with a guard or a tracing span.
+        """
+        guard = self.guard
+        if guard is None and span is None:
+            return params
+
+        size = self._get_request_size(params, kwargs)
+        if guard is not None and guard.check(self, size) == RESET:
+            self.data = {}
+            self._touch()
+            params = self._get_params(input, kwargs)
+            size = self._get_request_size(params, kwargs)
+        self.request_size = size
+        return params
+
+    def _trace(self, span, params):
+        """Describe the request on the tracing span."""
+        name = getattr(self, 'name', None)
+        if name is not None:
+            span.set_attribute('cleverbot.conversation', str(name))
+        cs = params.get('cs')
+        span.set_attribute('cleverbot.cs_size',
+                           len(cs.encode('utf-8')) if cs else 0)
+        span.set_attribute('cleverbot.request_size', self.request_size)
+        for tweak in ('tweak1', 'tweak2', 'tweak3'):
+            value = params.get('cb_settings_' + tweak)
+            if value is not None:
+                span.set_attribute('cleverbot.' + tweak, value)
+
+    def _get_params(self, input, kwargs):
+        revision = self._revision
+        template = self._template
+        if template is None or template[0] != revision:
+            # The encoded size of the template is filled in once needed
+            template = self._template = [revision, self._get_template(), None]
+        params = template[1].copy()
+        if input is not None:
+            params['input'] = input
+        cs = self.data.get('cs')
+        if cs is not None:
+            params['cs'] = cs
+        if not kwargs:
+            return params
+
         for tweak in ('tweak1', 'tweak2', 'tweak3'):
             if tweak not in kwargs:
                 continue
@@ -204,11 +709,10 @@ class SayMixinBase(object):
                 raise TypeError(message.format(tweak, setting))
             kwargs[setting] = kwargs.pop(tweak)
         params.update(kwargs)
-        # aiohttp doesn't filter None values
         return {key: value for key, value in params.items()
                 if value is not None}
 
 
 def load(module, file):
-    with ensure_file(file, 'rb') as file:
+    with ensure_file(file, 'rb') as file, batch():
         return GenericUnpickler(file, module=module).load()
@@ -0,0 +1,169 @@
+import collections
+import threading
+import time
+
+from .errors import (APIError, BudgetExceeded, CircuitOpen, DeadlineExceeded,
+                     Timeout, TransportError)
+
+clock = getattr(time, 'monotonic', time.time)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class Circuit(object):
+    """The state of the circuit of a single key and API endpoint."""
+
+    __slots__ = ('scope', 'state', 'calls', 'opened', 'probing', 'probed')
+
+    def __init__(self, scope, window):
+        self.scope = scope
+        self.state = CLOSED
+        # Whether each of the most recent calls failed
+        self.calls = collections.deque(maxlen=window)
+        self.opened = None
+        self.probing = 0
+        self.probed = 0
+
+
+class CircuitBreaker(object):
+    """Fail fast while the API keeps failing.
+
+    Every key and API endpoint gets a circuit of its own. A circuit opens once
+    enough of its recent calls timed out or failed with a 5xx APIError, after
+    which calls fail right away with CircuitOpen. After cooldown seconds it
+    becomes half-open and lets a few probe calls through: it closes once they
+    succeed and opens again as soon as one of them fails.
+
+    Attach it to Cleverbot with Cleverbot.breaker, conversations use the
+    breaker of their Cleverbot.
+    """
+
+    def __init__(self, threshold=0.5, window=20, min_calls=10, cooldown=30,
+                 probes=1, on_change=None):
+        """Initialize the circuit breaker with the given arguments.
+
+        Arguments:
+            threshold: The share of failed calls, from 0 to 1, that opens a
+                circuit.
+            window: How many of the most recent calls the share of failed
+                calls is taken over.
+            min_calls: How many calls a circuit needs to have seen before it
+                can open.
+            cooldown: How many seconds an open circuit fails fast before
+                letting probes through.
+            probes: How many probe calls a half-open circuit lets through at
+                once, and how many of them have to succeed for it to close.
+            on_change: A callable taking the (key, url) scope of the circuit,
+                its old state and its new state, called on every transition.
+        """
+        self.threshold = threshold
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.probes = probes
+        self.on_change = on_change
+        self.rejected = 0
+        self.transitions = collections.Counter()
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def state(self, key, url):
+        """Get the state of the circuit of the key and API endpoint, either
+        'closed', 'open' or 'half-open'.
+        """
+        circuit = self._circuits.get((key, url))
+        return CLOSED if circuit is None else circuit.state
+
+    def _transition(self, circuit, state):
+        """Move the circuit to the state and return the transition."""
+        old, circuit.state = circuit.state, state
+        self.transitions[old, state] += 1
+        return circuit.scope, old, state
+
+    def _notify(self, transition):
+        if transition is not None and self.on_change is not None:
+            self.on_change(*transition)
+
+    @staticmethod
+    def failed(error):
+        """Check whether the error counts against the circuit."""
+        if isinstance(error, BudgetExceeded):  # The API is too slow
+            return True
+        if isinstance(error, DeadlineExceeded):  # The caller's choice
+            return False
+        if isinstance(error, (Timeout, TransportError)):
+            return True
+        if isinstance(error, APIError):
+            try:
+                return int(error.status) >= 500
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def enter(self, key, url):
+        """Let a call to the key and API endpoint through the circuit.
+
+        Returns:
+            A token to pass into CircuitBreaker.exit once the call is done.
+
+        Raises:
+            CircuitOpen: The circuit is open.
+        """
+        scope = (key, url)
+        transition = None
+        with self._lock:
+            circuit = self._circuits.get(scope)
+            if circuit is None:
+                circuit = self._circuits[scope] = Circuit(scope, self.window)
+            if circuit.state == OPEN:
+                retry_after = circuit.opened + self.cooldown - clock()
+                if retry_after > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(url, retry_after)
+                transition = self._transition(circuit, HALF_OPEN)
+                circuit.probed = 0
+            if circuit.state == HALF_OPEN:
+                if circuit.probing >= self.probes:
+                    self.rejected += 1
+                    raise CircuitOpen(url, 0)
+                circuit.probing += 1
+                probe = True
+            else:
+                probe = False
+        self._notify(transition)
+        return circuit, probe
+
+    def exit(self, token, error=None):
+        """Record the outcome of a call through the circuit.
+
+        Arguments:
+            token: The token returned by CircuitBreaker.enter.
+            error: The exception the call raised, if any.
+        """
+        circuit, probe = token
+        failed = error is not None and self.failed(error)
+        transition = None
+        with self._lock:
+            if probe:
+                circuit.probing -= 1
+            if circuit.state == HALF_OPEN and probe:
+                if failed:
+                    circuit.opened = clock()
+                    transition = self._transition(circuit, OPEN)
+                elif error is None:
+                    # Errors that don't count either way, such as a passed
+                    # deadline, prove nothing about the API
+                    circuit.probed += 1
+                    if circuit.probed >= self.probes:
+                        circuit.calls.clear()
+                        transition = self._transition(circuit, CLOSED)
+            elif circuit.state == CLOSED:
+                calls = circuit.calls
+                calls.append(failed)
+                if (failed and len(calls) >= self.min_calls and
+                        sum(calls) >= self.threshold * len(calls)):
+                    circuit.opened = clock()
+                    transition = self._transition(circuit, OPEN)
+        self._notify(transition)
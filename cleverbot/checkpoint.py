@@ -0,0 +1,110 @@
+import os
+import tempfile
+import threading
+
+replace = getattr(os, 'replace', os.rename)
+
+
+class Checkpointer(object):
+    """Periodically save Cleverbot and all of its conversations in the
+    background.
+
+    Every checkpoint is taken from a snapshot of Cleverbot so saving doesn't
+    hold up anything that's talking to it. Checkpoints are written to a
+    temporary file first and then renamed so the file is never left half
+    written, while the older ones are kept around with a numbered suffix
+    (e.g. ``cleverbot.pickle.1``).
+    """
+
+    def __init__(self, cleverbot, filename, interval=60, keep=3):
+        """Initialize the checkpointer with the given arguments.
+
+        Arguments:
+            cleverbot: The Cleverbot to save.
+            filename: The filename to save the checkpoints to.
+            interval: How many seconds to wait between checkpoints.
+            keep: How many checkpoints to keep including the latest one.
+        """
+        if keep < 1:
+            raise ValueError("Need to keep at least one checkpoint")
+        self.cleverbot = cleverbot
+        self.filename = filename
+        self.interval = interval
+        self.keep = keep
+        self.error = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """Start checkpointing in a background thread."""
+        if self._thread is not None:
+            raise RuntimeError("Checkpointer has already been started")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, checkpoint=True):
+        """Stop the background thread.
+
+        Arguments:
+            checkpoint: Whether to take a final checkpoint after stopping.
+        """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        if checkpoint:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Take a checkpoint right away.
+
+        Returns:
+            The filename the checkpoint was saved to.
+        """
+        snapshot = self.cleverbot.snapshot()
+        with self._lock:
+            self._write(snapshot)
+        return self.filename
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as error:  # Don't let the thread die
+                self.error = error
+            else:
+                self.error = None
+
+    def _write(self, snapshot):
+        directory, basename = os.path.split(os.path.abspath(self.filename))
+        fd, temp = tempfile.mkstemp(prefix=basename + '.', suffix='.tmp',
+                                    dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                snapshot.save(file)
+                file.flush()
+                os.fsync(file.fileno())
+            self._rotate()
+            replace(temp, self.filename)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def _rotate(self):
+        names = [self.filename] + ['{}.{}'.format(self.filename, number)
+                                   for number in range(1, self.keep)]
+        for old, new in reversed(list(zip(names, names[1:]))):
+            if os.path.exists(old):
+                replace(old, new)
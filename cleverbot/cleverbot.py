@@ -1,16 +1,52 @@
 import functools
+import json
+import socket
+import threading
+import time
 
 import requests
 
-from . import __version__
+try:
+    from urllib3.exceptions import ProtocolError, ReadTimeoutError
+    from urllib3.response import HTTPResponse
+    from urllib3.util import Timeout as TimeoutSauce
+except ImportError:  # Older versions of requests vendor urllib3
+    from requests.packages.urllib3.exceptions import (ProtocolError,
+                                                      ReadTimeoutError)
+    from requests.packages.urllib3.response import HTTPResponse
+    from requests.packages.urllib3.util import Timeout as TimeoutSauce
 from .base import CleverbotBase, ConversationBase, SayMixinBase, load
-from .errors import APIError, DecodeError, Timeout
+from .errors import (CleverbotError, APIError, DeadlineExceeded, DecodeError,
+                     Timeout, TransportError)
+from .session import create_session, default_session
+from .workers import WorkerPool
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:  # Python 2
+    from urlparse import urlsplit
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# How much of the reply is read at a time while checking the deadline
+CHUNK_SIZE = 1024
+# Whether urllib3 can return whatever arrived instead of waiting for a whole
+# chunk, which it can since 2.1
+PARTIAL_READS = hasattr(HTTPResponse, 'read1')
 
 
 class SayMixin(SayMixinBase):
 
     __slots__ = ()
 
+    # Guards the lazy creation of the pools
+    _pool_lock = threading.Lock()
+
     def say(self, input=None, **kwargs):
         """Talk to Cleverbot.
 
@@ -18,34 +54,230 @@ class SayMixin(SayMixinBase):
             input: The input argument is what you want to say to Cleverbot,
                 such as "hello".
             tweak1-3: Changes Cleverbot's mood.
+            deadline: How many seconds the whole call may take. The connect,
+                read and total timeouts are cut short to fit in it.
             **kwargs: Keyword arguments to update the request parameters with.
 
         Returns:
-            Cleverbot's reply.
+            Cleverbot's reply, or a DegradedReply from Cleverbot.fallback if
+            the call failed or ran over its budget.
 
         Raises:
             APIError: A Cleverbot API error occurred.
             DecodeError: An error occurred while reading the reply.
             Timeout: The request timed out.
+            DeadlineExceeded: The deadline passed.
+            CircuitOpen: Cleverbot.breaker cut off the API.
+            Overloaded: Cleverbot.admission shed the request.
+            RequestTooLarge: Cleverbot.guard held the request back.
         """
+        deadline = kwargs.pop('deadline', None)
+        tracer = self.tracer
+        if tracer is None:
+            return self._say(input, kwargs, deadline=deadline)
+        with tracer.start_as_current_span('cleverbot.say') as span:
+            return self._say(input, kwargs, span, deadline)
+
+    def _say(self, input, kwargs, span=None, deadline=None):
+        fallback = self.fallback
+        if fallback is None:
+            return self._call(input, kwargs, span, deadline)
+        deadline, budget = self._get_budget(fallback, deadline)
+        try:
+            reply = self._call(input, kwargs, span, deadline, budget)
+        except CleverbotError:
+            reply = self._fall_back(fallback, input, span)
+            if reply is None:
+                raise
+            return reply
+        fallback.record(input, reply)
+        return reply
+
+    def _call(self, input, kwargs, span, deadline, budget=False):
+        expires = None
+        if deadline is not None:
+            if deadline <= 0:
+                raise DeadlineExceeded(deadline)
+            # Every phase after this point is bounded by what's left of it
+            expires = clock() + deadline
+        admission = self.admission
+        if admission is None:
+            return self._guard(input, kwargs, span, deadline, budget, expires)
+        admission.enter(deadline)
+        try:
+            return self._guard(input, kwargs, span, deadline, budget, expires)
+        finally:
+            admission.exit()
+
+    def _guard(self, input, kwargs, span, deadline, budget=False,
+               expires=None):
+        breaker = self.breaker
+        if breaker is None:
+            return self._send(input, kwargs, span, deadline, budget, expires)
+        token = breaker.enter(self.key, self.url)
+        try:
+            reply = self._send(input, kwargs, span, deadline, budget, expires)
+        except BaseException as error:
+            breaker.exit(token, error)
+            raise
+        breaker.exit(token)
+        return reply
+
+    def _send(self, input, kwargs, span, deadline, budget=False,
+              expires=None):
         params = self._get_params(input, kwargs)
+        params = self._check_size(input, kwargs, params, span)
+        if span is not None:
+            self._trace(span, params)
+        if deadline is not None and expires is None:
+            expires = clock() + deadline
+        left = None
+        if expires is not None:
+            left = expires - clock()
+            if left <= 0:
+                raise self._deadline_error(deadline, 'queue', budget)
+        timeouts, cut = self._get_timeouts(left)
+        connect, read = timeouts['connect'], timeouts['read']
+        options = {}
+        if left is None:
+            timeout = connect if connect == read else (connect, read)
+        else:
+            # The total keeps the connect and the wait for the headers within
+            # the deadline, the reply is streamed to keep the body within it
+            timeout = TimeoutSauce(connect=connect, read=read, total=left)
+            options['stream'] = True
+            if not PARTIAL_READS:
+                # The body is read past urllib3 and its decoding
+                options['headers'] = {'Accept-Encoding': 'identity'}
         try:
-            reply = self.session.get(
-                self.url, params=params, timeout=self.timeout)
-        except requests.Timeout:
-            raise Timeout(self.timeout)
+            reply = self.session.get(self.url, params=params, timeout=timeout,
+                                     **options)
+            if left is not None:
+                body = self._read(reply, expires, deadline, budget,
+                                  self._get_timeouts()[0]['read'])
+        except requests.Timeout as error:
+            # Older versions of requests don't tell the phases apart
+            connecting = getattr(requests, 'ConnectTimeout', ())
+            phase = 'connect' if isinstance(error, connecting) else 'read'
+            if phase in cut or (expires is not None and clock() >= expires):
+                raise self._deadline_error(deadline, phase, budget)
+            raise Timeout(timeouts[phase], phase)
+        except (requests.ConnectionError, ProtocolError) as error:
+            raise TransportError(error)
         else:
+            if span is not None:
+                span.set_attribute('http.status_code', reply.status_code)
             try:
-                data = reply.json()
+                if deadline is None:
+                    data = reply.json()
+                else:
+                    data = json.loads(body.decode('utf-8'))
             except ValueError as error:
                 raise DecodeError(error)
             else:
                 if reply.status_code == 200:
                     self.data = data
+                    self._touch()
                     return data.get('output')
                 else:
                     raise APIError(data.get('error'), data.get('status'))
 
+    def _read(self, reply, expires, deadline, budget, timeout):
+        """Read the body of a streamed reply, giving up once the deadline
+        passes.
+
+        Every read waits at most for what's left of the deadline, or for the
+        read timeout if that's shorter.
+        """
+        raw = reply.raw
+        # Unlike read, read1 returns whatever arrived instead of waiting for
+        # the whole chunk
+        if PARTIAL_READS:
+            read = functools.partial(raw.read1, decode_content=True)
+        else:
+            read = getattr(raw._fp, 'read1', None)
+            if read is None:  # Python 2
+                read = raw.read
+        sock = getattr(getattr(raw, '_connection', None), 'sock', None)
+        chunks = []
+        try:
+            while True:
+                left = expires - clock()
+                if left <= 0:
+                    raise self._deadline_error(deadline, 'read', budget)
+                capped = timeout is None or left < timeout
+                if sock is not None:
+                    sock.settimeout(left if capped else timeout)
+                try:
+                    chunk = read(CHUNK_SIZE)
+                except (ReadTimeoutError, socket.timeout) as error:
+                    if capped and sock is not None or clock() >= expires:
+                        raise self._deadline_error(deadline, 'read', budget)
+                    raise requests.ReadTimeout(error)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            # Releases the connection, or drops it if it wasn't read fully
+            reply.close()
+        return b''.join(chunks)
+
+    def submit(self, input=None, **kwargs):
+        """Talk to Cleverbot without waiting for the reply.
+
+        The request is queued in Cleverbot.pool and sent from one of its
+        threads. A default WorkerPool is created on first use if Cleverbot.pool
+        is None. Requests to the same conversation aren't ordered, wait for the
+        previous reply if that matters.
+
+        Arguments:
+            input: The input argument is what you want to say to Cleverbot,
+                such as "hello".
+            deadline: How many seconds the request may take, including the
+                time it's queued.
+            **kwargs: Keyword arguments to pass into say.
+
+        Returns:
+            A concurrent.futures.Future for Cleverbot's reply.
+
+        Raises:
+            QueueFull: The queue is full.
+        """
+        pool = self.pool
+        if pool is None:
+            with self._pool_lock:
+                pool = self.pool
+                if pool is None:
+                    pool = self.pool = WorkerPool()
+        deadline = kwargs.pop('deadline', None)
+        if deadline is None:
+            return pool.submit(self.say, input, **kwargs)
+
+        expires = clock() + deadline
+
+        def say():
+            remaining = expires - clock()
+            if remaining <= 0:
+                raise DeadlineExceeded(deadline)
+            return self.say(input, deadline=remaining, **kwargs)
+        return pool.submit(say)
+
+    say_nowait = submit
+
+    def chat(self, inputs, **kwargs):
+        """Talk to Cleverbot one input after the other.
+
+        Arguments:
+            inputs: An iterable of what to say to Cleverbot. It's consumed
+                lazily.
+            **kwargs: Keyword arguments to pass into say.
+
+        Yields:
+            Cleverbot's replies as they arrive.
+        """
+        for input in inputs:
+            yield self.say(input, **kwargs)
+
 
 class Cleverbot(SayMixin, CleverbotBase):
     """A Cleverbot API wrapper."""
@@ -60,12 +292,32 @@ class Cleverbot(SayMixin, CleverbotBase):
                 conversation history up to that point.
             timeout: How many seconds to wait for the API to respond before
                 giving up and raising an error.
+            connect_timeout: How many seconds to wait for a connection to the
+                API. Defaults to timeout.
+            read_timeout: How many seconds to wait between receiving parts of
+                the reply. Defaults to timeout.
+            session: A requests.Session to send the requests with instead of
+                creating one. It's left open when Cleverbot is closed.
+            shared: A SharedSession to send the requests with, or True to
+                share the process-wide default_session with every other
+                Cleverbot that does. It's only closed once every Cleverbot
+                sharing it is.
         """
+        session = kwargs.pop('session', None)
+        shared = kwargs.pop('shared', False)
+        if session is not None and shared:
+            raise TypeError("Supplied both 'session' and 'shared'")
         super(Cleverbot, self).__init__(*args, **kwargs)
-        self.session = requests.Session()
-        headers = {'User-Agent': 'cleverbot.py/' + __version__ + ' '
-                   '(+https://github.com/orlnub123/cleverbot.py)'}
-        self.session.headers.update(headers)
+        if session is not None:
+            self._session = session
+        elif shared:
+            self._shared = default_session if shared is True else shared
+
+    def _create_session(self):
+        if self._shared is not None:
+            return self._shared.acquire()
+        self._owns_session = True
+        return create_session()
 
     def conversation(self, name=None, **kwargs):
         """Make a new conversation.
@@ -84,9 +336,194 @@ class Cleverbot(SayMixin, CleverbotBase):
         super(Cleverbot, self).conversation(name, convo)
         return convo
 
+    def conversations_from(self, records):
+        """Make many conversations at once.
+
+        Arguments:
+            records: An iterable of (name, cs, key, timeout, tweaks) tuples
+                where tweaks is a tuple of tweak1, tweak2 and tweak3 or None.
+                The timeout may also be a tuple of timeout, connect_timeout
+                and read_timeout.
+                Like with Cleverbot.conversation, values that are None will be
+                taken from Cleverbot and a name of None makes a nameless
+                conversation.
+
+        Returns:
+            A list of the new conversations.
+        """
+        return super(Cleverbot, self).conversations_from(records, Conversation)
+
+    def chat_many(self, streams, concurrency=8, **kwargs):
+        """Chat in many conversations at once.
+
+        Every conversation is chatted in by a single thread so its inputs are
+        said in order, while up to concurrency conversations are chatted in at
+        once over Cleverbot's connection pool. The streams and their inputs
+        are consumed lazily.
+
+        Arguments:
+            streams: A dictionary or an iterable of pairs of a conversation and
+                an iterable of what to say in it.
+            concurrency: How many conversations to chat in at once.
+            **kwargs: Keyword arguments to pass into say.
+
+        Yields:
+            Tuples of the conversation, the input and Cleverbot's reply as the
+            replies arrive.
+
+        Raises:
+            CleverbotError: Saying something failed. Chatting is stopped.
+        """
+        if isinstance(streams, dict):
+            streams = streams.items()
+        streams = iter(streams)
+        lock = threading.Lock()
+        results = queue.Queue(concurrency)
+        stopped = threading.Event()
+
+        def put(result):
+            while not stopped.is_set():
+                try:
+                    results.put(result, timeout=0.1)
+                except queue.Full:
+                    continue
+                return
+
+        def work():
+            try:
+                while not stopped.is_set():
+                    with lock:
+                        try:
+                            convo, inputs = next(streams)
+                        except StopIteration:
+                            return
+                    for input in inputs:
+                        if stopped.is_set():
+                            return
+                        try:
+                            reply = convo.say(input, **kwargs)
+                        except Exception as error:
+                            put((convo, input, None, error))
+                            return
+                        put((convo, input, reply, None))
+            finally:
+                put(None)
+
+        threads = [threading.Thread(target=work) for _ in range(concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            running = concurrency
+            while running:
+                result = results.get()
+                if result is None:
+                    running -= 1
+                    continue
+
+                convo, input, reply, error = result
+                if error is not None:
+                    raise error
+                yield convo, input, reply
+        finally:
+            stopped.set()
+
+    def warmup(self, connections=1, refresh=None):
+        """Resolve the API's host and open connections to it ahead of time so
+        that the first requests don't have to.
+
+        Arguments:
+            connections: How many connections to open and keep alive. Only
+                Cleverbot's own session is made to keep more than
+                requests.adapters.DEFAULT_POOLSIZE of them, a session that's
+                passed in or shared is left as it is.
+            refresh: If not None, how many seconds to wait between warming up
+                again in a background thread, replacing the connections the
+                API closed in the meantime. Set it below the API's keep-alive
+                timeout.
+
+        Returns:
+            How many seconds warming up took.
+        """
+        start = clock()
+        url = urlsplit(self.url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        # Primes the resolver's cache, kept alive connections don't need it
+        socket.getaddrinfo(url.hostname, port, 0, socket.SOCK_STREAM)
+
+        session = self.session
+        if self._owns_session:
+            adapter = session.get_adapter(self.url)
+            size = getattr(adapter, '_pool_maxsize',
+                           requests.adapters.DEFAULT_POOLSIZE)
+            if connections > size:
+                origin = '{}://{}'.format(url.scheme, url.netloc)
+                session.mount(origin, requests.adapters.HTTPAdapter(
+                    pool_maxsize=connections))
+                if adapter not in session.adapters.values():
+                    # The smaller adapter of an earlier warmup was replaced
+                    adapter.close()
+
+        # Hold every response open until all of them are in so that each one
+        # gets a connection of its own
+        responses = []
+        errors = []
+
+        def connect():
+            try:
+                responses.append(session.head(
+                    self.url, timeout=self.timeout, stream=True))
+            except requests.RequestException as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=connect)
+                   for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for response in responses:
+            response.content  # Releases the connection back into the pool
+        if errors:
+            if isinstance(errors[0], requests.Timeout):
+                raise Timeout(self.timeout)
+            raise errors[0]
+
+        if refresh is not None and self._warmer is None:
+            self._warmer = stopped = threading.Event()
+
+            def rewarm():
+                while not stopped.wait(refresh):
+                    try:
+                        self.warmup(connections)
+                    except Exception:  # Try again next time
+                        pass
+
+            thread = threading.Thread(target=rewarm)
+            thread.daemon = True
+            thread.start()
+        return clock() - start
+
     def close(self):
-        """Close Cleverbot's connection to the API."""
-        self.session.close()
+        """Close Cleverbot's connection to the API after sending the
+        submitted requests.
+        """
+        if self._warmer is not None:
+            self._warmer.set()
+            self._warmer = None
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        session = self._session
+        if session is None:
+            return
+        if self._shared is not None:
+            self._session = None
+            self._shared.release()
+        elif self._owns_session:
+            self._session = None
+            self._owns_session = False
+            session.close()
 
 
 class Conversation(SayMixin, ConversationBase):
@@ -0,0 +1,268 @@
+import array
+import io
+import json
+import mmap
+import struct
+import sys
+
+from .utils import ensure_file
+
+MAGIC = b'CBCOLS01'
+HEADER = struct.Struct('<Q')
+# Every column starts on a multiple of this so it can be viewed in place
+ALIGNMENT = 8
+# 'q' is missing from Python 2's array module
+INT64 = 'q' if sys.version_info >= (3, 3) else 'l'
+
+# The exported fields and how each of them is stored, strings are stored as
+# utf-8 data and offsets into it
+FIELDS = (
+    ('name', 'str'),
+    ('key', 'str'),
+    ('cs', 'str'),
+    ('timeout', 'd'),
+    ('connect_timeout', 'd'),
+    ('read_timeout', 'd'),
+    ('tweak1', 'd'),
+    ('tweak2', 'd'),
+    ('tweak3', 'd'),
+    ('output', 'str'),
+)
+
+
+def _tobytes(column):
+    if isinstance(column, array.array):
+        tobytes = getattr(column, 'tobytes', None) or column.tostring
+        return tobytes()
+    return column
+
+
+def _encode(field, values):
+    """Turn the values of a field into its columns."""
+    kind = dict(FIELDS)[field]
+    valid = array.array('B', [value is not None for value in values])
+    if kind != 'str':
+        values = [0 if value is None else value for value in values]
+        return {field + '.valid': valid,
+                field + '.values': array.array(kind, values)}
+
+    offsets = array.array(INT64, [0])
+    data = bytearray()
+    for value in values:
+        if value is not None:
+            if not isinstance(value, str):
+                message = "Only strings can be exported as the {}, not {!r}"
+                raise TypeError(message.format(field, type(value).__name__))
+            data += value.encode('utf-8')
+        offsets.append(len(data))
+    return {field + '.valid': valid, field + '.offsets': offsets,
+            field + '.data': bytes(data)}
+
+
+def _tweak(value):
+    """Turn a tweak read back as a float into an int if it was one."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _overrides(convos, name):
+    """Get the values the conversations override a setting of Cleverbot with.
+    """
+    if not convos:
+        return []
+    # Read the slot directly, missing attributes are slow to look up through
+    # __getattr__
+    slot = getattr(type(convos[0]), '_' + name)
+    values = []
+    for convo in convos:
+        try:
+            values.append(slot.__get__(convo))
+        except AttributeError:
+            values.append(None)
+    return values
+
+
+def export_columns(cleverbot, file):
+    """Save the conversations of Cleverbot as columns. See
+    Cleverbot.export_columns.
+    """
+    convos = cleverbot.conversations
+    if convos is None:
+        convos = []
+    elif isinstance(convos, dict):
+        convos = list(convos.values())
+    else:
+        convos = list(convos)
+
+    rows = {
+        'name': [convo.name for convo in convos],
+        'cs': [convo.data.get('cs') for convo in convos],
+        'output': [convo.data.get('output') for convo in convos],
+    }
+    for field in ('key', 'timeout', 'connect_timeout', 'read_timeout',
+                  'tweak1', 'tweak2', 'tweak3'):
+        rows[field] = _overrides(convos, field)
+    columns = {}
+    for field, _ in FIELDS:
+        columns.update(_encode(field, rows[field]))
+
+    layout = {}
+    blobs = []
+    offset = 0
+    for name in sorted(columns):
+        data = _tobytes(columns[name])
+        typecode = getattr(columns[name], 'typecode', None)
+        layout[name] = [offset, len(data), typecode]
+        blobs.append(data + b'\0' * (-len(data) % ALIGNMENT))
+        offset += len(blobs[-1])
+    header = json.dumps({
+        'count': len(convos),
+        'byteorder': sys.byteorder,
+        'columns': layout,
+    }, sort_keys=True).encode('utf-8')
+    start = len(MAGIC) + HEADER.size + len(header)
+    header += b' ' * (-start % ALIGNMENT)
+
+    with ensure_file(file, 'wb') as file:
+        file.write(MAGIC)
+        file.write(HEADER.pack(len(header)))
+        file.write(header)
+        for data in blobs:
+            file.write(data)
+
+
+class ColumnFile(object):
+    """A file saved with Cleverbot.export_columns.
+
+    Every column is a contiguous, aligned buffer at the offset given in the
+    JSON header, relative to the end of the header, so other tools can memory
+    map the file and use the columns in place.
+    """
+
+    def __init__(self, file):
+        """Open the column file.
+
+        Arguments:
+            file: The filename or file object to read from.
+        """
+        if isinstance(file, str):
+            self._file = file = open(file, 'rb')
+        else:
+            self._file = None
+        try:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, io.UnsupportedOperation, ValueError):
+            file.seek(0)
+            self._buffer = file.read()
+
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("Not a Cleverbot column file")
+        start = len(MAGIC) + HEADER.size
+        length, = HEADER.unpack(self._buffer[len(MAGIC):start])
+        header = json.loads(self._buffer[start:start + length].decode('utf-8'))
+        self._start = start + length
+        self._count = header['count']
+        self._swap = header['byteorder'] != sys.byteorder
+        self._columns = header['columns']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Close the file."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def column(self, name):
+        """Read a raw column, such as 'cs.offsets' or 'tweak1.values'.
+
+        Returns:
+            An array of the column, or bytes for the data of string fields.
+
+        Raises:
+            KeyError: There's no such column.
+        """
+        offset, length, typecode = self._columns[name]
+        offset += self._start
+        data = self._buffer[offset:offset + length]
+        if typecode is None:
+            return data
+        column = array.array(typecode)
+        frombytes = getattr(column, 'frombytes', None) or column.fromstring
+        frombytes(data)
+        if self._swap:
+            column.byteswap()
+        return column
+
+    def field(self, name):
+        """Read all of the values of a field, one for every conversation.
+
+        Arguments:
+            name: One of name, key, cs, timeout, connect_timeout,
+                read_timeout, tweak1, tweak2, tweak3 and output.
+
+        Returns:
+            A list of the values where a missing value is None.
+
+        Raises:
+            KeyError: There's no such field.
+        """
+        valid = self.column(name + '.valid')
+        if dict(FIELDS)[name] != 'str':
+            values = self.column(name + '.values')
+            return [value if present else None
+                    for value, present in zip(values, valid)]
+
+        offsets = self.column(name + '.offsets')
+        data = self.column(name + '.data')
+        text = data.decode('utf-8')
+        if len(text) != len(data):
+            # Offsets are in bytes so only ascii text can be sliced directly
+            return [data[start:end].decode('utf-8') if present else None
+                    for start, end, present
+                    in zip(offsets, offsets[1:], valid)]
+        return [text[start:end] if present else None
+                for start, end, present in zip(offsets, offsets[1:], valid)]
+
+    def records(self):
+        """Read the conversations as records for
+        Cleverbot.conversations_from.
+        """
+        fields = ('name', 'cs', 'key', 'timeout', 'tweak1', 'tweak2', 'tweak3')
+        names, cs, keys, timeouts, tweak1, tweak2, tweak3 = map(
+            self.field, fields)
+        # Files exported before the split timeouts don't have them
+        if 'connect_timeout.valid' in self._columns:
+            split = zip(timeouts, self.field('connect_timeout'),
+                        self.field('read_timeout'))
+            timeouts = [timeout[0] if timeout[1:] == (None, None) else timeout
+                        for timeout in split]
+        tweaks = [None if tweak == (None, None, None) else
+                  tuple(map(_tweak, tweak))
+                  for tweak in zip(tweak1, tweak2, tweak3)]
+        return list(zip(names, cs, keys, timeouts, tweaks))
+
+
+def import_columns(cleverbot, file):
+    """Make conversations from columns saved with Cleverbot.export_columns.
+    See Cleverbot.import_columns.
+    """
+    if not isinstance(file, ColumnFile):
+        with ColumnFile(file) as file:
+            return import_columns(cleverbot, file)
+
+    convos = cleverbot.conversations_from(file.records())
+    for convo, output in zip(convos, file.field('output')):
+        if output is not None:
+            convo.data['output'] = output
+    return convos
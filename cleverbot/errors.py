@@ -14,19 +14,130 @@ class APIError(CleverbotError):
         self.status = status
 
 
+class CircuitOpen(CleverbotError):
+    """Raised without sending the request while the circuit breaker has cut
+    off the API after too many failures.
+    """
+
+    def __init__(self, url=None, retry_after=None):
+        if retry_after:
+            message = "Circuit to {} is open, retry in {:.1f} seconds".format(
+                url, retry_after)
+        else:
+            message = "Circuit to {} is open while it's being probed".format(
+                url)
+        super(CircuitOpen, self).__init__(message)
+        self.url = url
+        self.retry_after = retry_after
+
+
 class DecodeError(CleverbotError):
     """Raised when a decode error occurs while reading the reply. Reset
     Cleverbot or the respective conversation to fix it.
     """
 
 
+class Overloaded(CleverbotError):
+    """Raised without sending the request when admission control sheds it
+    because requests have been queueing for too long.
+    """
+
+    def __init__(self, delay=None):
+        if delay is not None:
+            message = "Overloaded, shed after queueing {:.3f} seconds".format(
+                delay)
+        else:
+            message = "Overloaded"
+        super(Overloaded, self).__init__(message)
+        self.delay = delay
+
+
+class QueueFull(CleverbotError):
+    """Raised when a request can't be queued because the queue is full or
+    when it's dropped from the queue to make room for a newer one.
+    """
+
+
+class RequestTooLarge(CleverbotError):
+    """Raised without sending the request when it's too large for the URL
+    length limits. Reset Cleverbot or the respective conversation to fix it.
+    """
+
+    def __init__(self, size=None, limit=None):
+        message = "Request of {} bytes exceeds the limit of {} bytes".format(
+            size, limit)
+        super(RequestTooLarge, self).__init__(message)
+        self.size = size
+        self.limit = limit
+
+
+class RequestSizeWarning(UserWarning):
+    """Issued when a request is growing close to the URL length limits."""
+
+    def __init__(self, size=None, limit=None):
+        if limit is not None:
+            message = "Request of {} bytes nears the limit of {} bytes".format(
+                size, limit)
+        else:
+            message = "Request of {} bytes is unusually large".format(size)
+        super(RequestSizeWarning, self).__init__(message)
+        self.size = size
+        self.limit = limit
+
+
+class TransportError(CleverbotError):
+    """Raised when the API can't be reached or the connection breaks before
+    the reply arrives, such as when the connection is refused or reset or
+    the host name doesn't resolve.
+    """
+
+
 class Timeout(CleverbotError):
-    """Raised when the request takes longer than the specified time."""
+    """Raised when the request takes longer than the specified time.
+
+    Timeout.phase tells which timeout expired: 'connect' while connecting to
+    the API, 'read' while waiting for the reply or 'total' for the request as
+    a whole. It's None if that isn't known.
+    """
+
+    # How each phase is described in the error message
+    phases = {
+        'queue': "before the request could be sent",
+        'connect': "while connecting",
+        'read': "while waiting for the reply",
+        'total': None,
+    }
 
-    def __init__(self, timeout=None):
+    def __init__(self, timeout=None, phase=None):
         if timeout is not None:
             message = "Request timed out after {} seconds".format(timeout)
         else:
             message = "Request timed out"
+        if self.phases.get(phase) is not None:
+            message += " " + self.phases[phase]
         super(Timeout, self).__init__(message)
         self.timeout = timeout
+        self.phase = phase
+
+
+class DeadlineExceeded(Timeout):
+    """Raised when the deadline of a request passes, either before it could
+    be sent ('queue' phase) or while it was being sent.
+    """
+
+    def __init__(self, deadline=None, phase='queue'):
+        if deadline is not None:
+            message = "Deadline of {} seconds passed".format(deadline)
+        else:
+            message = "Deadline passed"
+        message += " " + (self.phases.get(phase) or "before getting a reply")
+        CleverbotError.__init__(self, message)
+        self.timeout = deadline
+        self.phase = phase
+
+
+class BudgetExceeded(DeadlineExceeded):
+    """Raised when a request runs over the latency budget of the fallback.
+    Unlike other passed deadlines it counts against the circuit breaker,
+    since the budget is a limit on how slow the API may be.
+    """
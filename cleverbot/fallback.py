@@ -0,0 +1,89 @@
+import collections
+import re
+import threading
+
+_punctuation = re.compile(r'[^\w\s]+', re.UNICODE)
+
+
+class DegradedReply(type(u'')):  # unicode on Python 2
+    """A reply that came from the fallback instead of Cleverbot."""
+
+    __slots__ = ()
+
+    degraded = True
+
+
+class ReplyCorpus(object):
+    """Answer from earlier replies while Cleverbot can't.
+
+    Every reply Cleverbot gives is recorded under its normalized input, and
+    when a call fails or runs over budget the last reply to the same
+    normalized input is returned instead, as a DegradedReply. Looking up a
+    reply is a single dictionary lookup and never touches the cleverbot
+    state, so the conversation carries on from where it was once Cleverbot
+    is back.
+
+    Attach it to Cleverbot with Cleverbot.fallback, conversations use the
+    fallback of their Cleverbot.
+    """
+
+    def __init__(self, budget=None, maxsize=10000, default=None):
+        """Initialize the corpus with the given arguments.
+
+        Arguments:
+            budget: How many seconds a call may take before falling back, or
+                None to only fall back when it fails.
+            maxsize: How many replies to keep, the least recently recorded
+                ones are dropped first.
+            default: What to reply with when no earlier reply matches, or None
+                to raise the error of the call instead.
+        """
+        self.budget = budget
+        self.maxsize = maxsize
+        self.default = default
+        self.hits = 0
+        self.misses = 0
+        self._replies = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._replies)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(input):
+        """Normalize the input so that trivially different inputs match."""
+        if input is None:
+            return ''
+        return ' '.join(_punctuation.sub(' ', input.lower()).split())
+
+    def record(self, input, output):
+        """Remember Cleverbot's output to the input."""
+        if output is None:
+            return
+        key = self.normalize(input)
+        replies = self._replies
+        with self._lock:
+            replies.pop(key, None)
+            replies[key] = output
+            while len(replies) > self.maxsize:
+                replies.popitem(last=False)
+
+    def reply(self, input):
+        """Get a degraded reply to the input, or None if there's none."""
+        output = self._replies.get(self.normalize(input))
+        if output is None:
+            output = self.default
+            if output is None:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return DegradedReply(output)
@@ -0,0 +1,93 @@
+import string
+import warnings
+
+from .errors import RequestSizeWarning, RequestTooLarge
+
+WARN = 'warn'
+RAISE = 'raise'
+RESET = 'reset'
+
+# Bytes that are sent as they are in a query string
+_safe = (string.ascii_letters + string.digits + '_.-~').encode('ascii')
+
+
+def encoded_size(value):
+    """Get the length of the value once it's encoded into a query string."""
+    if not isinstance(value, type(u'')):
+        value = str(value)
+    data = value.encode('utf-8')
+    if data.isalnum():  # Usually true for the cleverbot state
+        return len(data)
+    unsafe = data.translate(None, _safe)
+    # Everything but spaces is percent-encoded into three bytes
+    return len(data) + 2 * (len(unsafe) - unsafe.count(b' '))
+
+
+class SizeGuard(object):
+    """Keep the requests from outgrowing the URL length limits.
+
+    The cleverbot state is sent in the query string of every request and
+    grows with every reply, so the URLs of long conversations keep getting
+    longer until the API or a proxy refuses them. Once a request reaches
+    warn bytes a RequestSizeWarning is issued, and once it reaches limit
+    bytes the action is taken: 'raise' raises RequestTooLarge without
+    sending the request and 'reset' rolls the conversation over to a fresh
+    state before sending it.
+
+    Attach it to Cleverbot with Cleverbot.guard, conversations use the guard
+    of their Cleverbot.
+    """
+
+    def __init__(self, warn=4096, limit=8192, action=RAISE, policy=None):
+        """Initialize the guard with the given arguments.
+
+        Arguments:
+            warn: How many bytes a request may take before warning, or None
+                to never warn.
+            limit: How many bytes a request may take before taking the action,
+                or None to never take it.
+            action: What to do once a request reaches the limit, either
+                'raise' or 'reset'.
+            policy: A callable taking the Cleverbot or conversation, the size
+                of its request and the action the thresholds call for (or
+                None), which returns the action to take instead: 'warn',
+                'raise', 'reset' or None.
+        """
+        self.warn = warn
+        self.limit = limit
+        self.action = action
+        self.policy = policy
+        self.largest = 0
+        self.warned = 0
+        self.raised = 0
+        self.reset = 0
+
+    def check(self, convo, size):
+        """Check the size of a request about to be sent by the Cleverbot or
+        conversation, warning or raising if necessary.
+
+        Returns:
+            The action taken.
+
+        Raises:
+            RequestTooLarge: The request is too large to be sent.
+        """
+        if size > self.largest:
+            self.largest = size
+        if self.limit is not None and size >= self.limit:
+            action = self.action
+        elif self.warn is not None and size >= self.warn:
+            action = WARN
+        else:
+            action = None
+        if self.policy is not None:
+            action = self.policy(convo, size, action)
+        if action == WARN:
+            self.warned += 1
+            warnings.warn(RequestSizeWarning(size, self.limit))
+        elif action == RAISE:
+            self.raised += 1
+            raise RequestTooLarge(size, self.limit)
+        elif action == RESET:
+            self.reset += 1
+        return action
@@ -0,0 +1,116 @@
+import copy
+import io
+import mmap
+import pickle
+import struct
+
+from .utils import GenericUnpickler, ensure_file
+
+MAGIC = b'CBINDEX1'
+FOOTER = struct.Struct('<QQ8s')
+
+
+def save_indexed(cleverbot, file):
+    """Save Cleverbot and its conversations so that every conversation can be
+    read on its own. See Cleverbot.save_indexed.
+    """
+    convos = cleverbot.conversations
+    if convos is not None and not isinstance(convos, dict):
+        raise TypeError("Only named conversations can be indexed")
+
+    with ensure_file(file, 'wb') as file:
+        file.write(MAGIC)
+        offset = len(MAGIC)
+
+        def write(obj):
+            data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+            file.write(data)
+            return len(data)
+
+        header = copy.copy(cleverbot)
+        header.conversations = None
+        header_length = write(header)
+        index = {None: (offset, header_length)}
+        offset += header_length
+        for name, convo in (convos or {}).items():
+            state, version = convo.__getstate__()
+            del state['cleverbot']
+            length = write((state, version))
+            index[name] = (offset, length)
+            offset += length
+
+        index_length = write(index)
+        file.write(FOOTER.pack(offset, index_length, MAGIC))
+
+
+class IndexedFile(object):
+    """A file saved with Cleverbot.save_indexed.
+
+    Only the index is read when opening it, the conversations themselves are
+    read on demand from a memory map of the file.
+    """
+
+    def __init__(self, file):
+        """Open the indexed file.
+
+        Arguments:
+            file: The filename or file object to read from.
+        """
+        if isinstance(file, str):
+            self._file = file = open(file, 'rb')
+        else:
+            self._file = None
+        try:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, io.UnsupportedOperation, ValueError):
+            file.seek(0)
+            self._buffer = file.read()
+
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("Not an indexed Cleverbot file")
+        offset, length, magic = FOOTER.unpack(self._buffer[-FOOTER.size:])
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Indexed Cleverbot file is truncated")
+        self._index = pickle.loads(self._buffer[offset:offset + length])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, name):
+        return name is not None and name in self._index
+
+    def __iter__(self):
+        return (name for name in self._index if name is not None)
+
+    def __len__(self):
+        return len(self._index) - 1
+
+    def close(self):
+        """Close the file."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def read(self, name, module='cleverbot.cleverbot'):
+        """Read a single record from the file.
+
+        Arguments:
+            name: The name of the conversation to read. If None the saved
+                Cleverbot without its conversations is read instead.
+            module: The module to take Cleverbot and Conversation from.
+
+        Returns:
+            The unpickled Cleverbot or the pickled state of the conversation.
+
+        Raises:
+            KeyError: The conversation isn't in the file.
+        """
+        offset, length = self._index[name]
+        with io.BytesIO(self._buffer[offset:offset + length]) as file:
+            return GenericUnpickler(file, module=module).load()
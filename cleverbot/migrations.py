@@ -1,12 +1,19 @@
 import collections
+import contextlib
 import functools
 import inspect
 import pickle
+import threading
 
 
 migrations = collections.defaultdict(
     functools.partial(collections.defaultdict, dict))
 migratables = []
+# Migration plans looked up by get_migrations, keyed by the version migrated
+# from, the version migrated to and the migratable class
+plans = {}
+# The states of batched classes waiting to be migrated together, per thread
+_batch = threading.local()
 
 
 def migration(version, cls=None, downgrade=False, regression=False):
@@ -17,15 +24,32 @@ def migration(version, cls=None, downgrade=False, regression=False):
         type = 'upgrade' if not downgrade else 'downgrade'
         migrations[cls][version][type] = func
         func.regression = regression
+        plans.clear()
         return func
     return decorator
 
 
-def migratable(cls):
+def migratable(cls=None, batched=False):
+    """Make the class's pickled state carry the version it was saved by
+    and migrate it on unpickling.
+
+    The older states of batched classes unpickled by load are set aside and
+    migrated together, with a single plan lookup and regression check, right
+    before the next non-batched object (or the end of load) needs them.
+    """
+    if cls is None:
+        return functools.partial(migratable, batched=batched)
+
     migratables.append(cls)
     original_getstate = cls.__getstate__
     original_setstate = cls.__setstate__
 
+    def restore(self, state):
+        if hasattr(original_setstate, '__get__'):
+            original_setstate.__get__(self)(state)
+        else:
+            original_setstate(state)
+
     @functools.wraps(cls.__getstate__)
     def getstate(self):
         if hasattr(original_getstate, '__get__'):
@@ -37,23 +61,93 @@ def migratable(cls):
     @functools.wraps(cls.__setstate__)
     def setstate(self, state):
         state, version = state
-        for migration in get_migrations(version, __version__, type(self)):
-            if migration.regression:
-                raise pickle.UnpicklingError(
-                    "Won't implicitly migrate due to a regression: {!r}. "
-                    "Force migrate via the CLI. Learn more with `python -m "
-                    "cleverbot migrate -h`".format(inspect.getdoc(migration)))
-            state = migration(state)
-        if hasattr(original_setstate, '__get__'):
-            original_setstate.__get__(self)(state)
-        else:
-            original_setstate(state)
+        deferred = getattr(_batch, 'states', None)
+        if deferred is not None:
+            if batched and version != __version__:
+                deferred.append((self, restore, state, version))
+                return
+            if not batched:
+                migrate_batch()
+        if version != __version__:
+            plan = get_migrations(version, __version__, type(self))
+            check_regressions(plan)
+            for migration in plan:
+                state = migration(state)
+        restore(self, state)
 
     cls.__getstate__ = getstate
     cls.__setstate__ = setstate
     return cls
 
 
+def check_regressions(plan):
+    for migration in plan:
+        if migration.regression:
+            raise pickle.UnpicklingError(
+                "Won't implicitly migrate due to a regression: {!r}. "
+                "Force migrate via the CLI. Learn more with `python -m "
+                "cleverbot migrate -h`".format(inspect.getdoc(migration)))
+
+
+def migrate_states(states, cls):
+    """Migrate many pickled states of a migratable class at once.
+
+    Arguments:
+        states: An iterable of (state, version) tuples as returned by the
+            class's __getstate__.
+        cls: The migratable class the states belong to, or None for the
+            top-level states of old versions.
+
+    Returns:
+        A list of the states migrated to the current version, ready to be
+        passed to the original __setstate__ of the class.
+    """
+    migrated = []
+    checked = {}
+    for state, version in states:
+        if version != __version__:
+            plan = checked.get(version)
+            if plan is None:
+                plan = checked[version] = get_migrations(version, __version__,
+                                                         cls)
+                check_regressions(plan)
+            for migration in plan:
+                state = migration(state)
+        migrated.append(state)
+    return migrated
+
+
+def migrate_batch():
+    """Migrate and restore the states set aside by the batched classes."""
+    batch = _batch.states
+    if not batch:
+        return
+    _batch.states = []
+    groups = collections.OrderedDict()
+    for item in batch:
+        groups.setdefault(type(item[0]), []).append(item)
+    # Every group is checked for regressions before anything is restored
+    migrated = [migrate_states([item[2:] for item in group], cls)
+                for cls, group in groups.items()]
+    for group, states in zip(groups.values(), migrated):
+        for (obj, restore, _, _), state in zip(group, states):
+            restore(obj, state)
+
+
+@contextlib.contextmanager
+def batch():
+    """Set aside the older states of batched classes unpickled inside the
+    block and migrate them together.
+    """
+    previous = getattr(_batch, 'states', None)
+    _batch.states = []
+    try:
+        yield
+        migrate_batch()
+    finally:
+        _batch.states = previous
+
+
 # Circular import woes
 from . import __version__
 from .base import CleverbotBase
@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import threading
+import time
+
+from .errors import DeadlineExceeded
+
+clock = getattr(time, 'monotonic', time.time)
+
+
+class SchedulerBase(object):
+    """Base class for Scheduler."""
+
+    def __init__(self, concurrency=10):
+        self.concurrency = concurrency
+        self.active = 0
+        self.dispatched = 0
+        self.expired = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self._queue = []
+        self._counter = itertools.count()
+
+    @property
+    def queued(self):
+        """How many requests are waiting to be sent."""
+        return len(self._queue)
+
+    @property
+    def mean_wait(self):
+        """The average time in seconds a request waited before being sent."""
+        return self.waited / self.dispatched if self.dispatched else 0.0
+
+    def _entry(self, priority, expires):
+        # Higher priorities first, then the earliest deadline first
+        return [-priority, float('inf') if expires is None else expires,
+                next(self._counter), clock()]
+
+    def _dispatch(self, entry):
+        waited = clock() - entry[3]
+        self.dispatched += 1
+        self.waited += waited
+        self.max_wait = max(self.max_wait, waited)
+
+
+class Scheduler(SchedulerBase):
+    """Limit how many requests are in flight at once and send the queued ones
+    by priority and deadline.
+
+    Requests are sent in order of priority and requests of the same priority
+    earliest deadline first. Requests whose deadline passes while they're
+    waiting are dropped without being sent.
+    """
+
+    def __init__(self, concurrency=10):
+        """Initialize the scheduler.
+
+        Arguments:
+            concurrency: The maximum number of requests in flight.
+        """
+        super(Scheduler, self).__init__(concurrency)
+        self._condition = threading.Condition()
+
+    def say(self, convo, input=None, priority=0, deadline=None, **kwargs):
+        """Talk to Cleverbot once it's the request's turn.
+
+        Arguments:
+            convo: The Cleverbot or conversation to talk to.
+            input: What to say to Cleverbot.
+            priority: Requests with a higher priority are sent first.
+            deadline: How many seconds the request may take. It's dropped if
+                it's still waiting to be sent by then, and whatever is left
+                of it bounds the request itself.
+            **kwargs: Keyword arguments to pass into say.
+
+        Returns:
+            Cleverbot's reply.
+
+        Raises:
+            DeadlineExceeded: The deadline passed before the request was sent.
+        """
+        expires = None if deadline is None else clock() + deadline
+        entry = self._entry(priority, expires)
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    now = clock()
+                    if expires is not None and now >= expires:
+                        self.expired += 1
+                        raise DeadlineExceeded(deadline)
+                    if (self._queue[0] is entry and
+                            self.active < self.concurrency):
+                        break
+                    self._condition.wait(
+                        None if expires is None else expires - now)
+            except BaseException:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self.active += 1
+            self._dispatch(entry)
+            # The next request may fit as well
+            self._condition.notify_all()
+
+        if expires is not None:
+            kwargs['deadline'] = expires - clock()
+        try:
+            return convo.say(input, **kwargs)
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify_all()
@@ -0,0 +1,75 @@
+import threading
+
+import requests
+
+from . import __version__
+
+HEADERS = {'User-Agent': 'cleverbot.py/' + __version__ + ' '
+           '(+https://github.com/orlnub123/cleverbot.py)'}
+
+
+def create_session():
+    """Create a session set up to talk to the API."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    return session
+
+
+class SharedSessionBase(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self.references = 0
+
+    def _acquire(self, create):
+        with self._lock:
+            if self._session is None:
+                self._session = create()
+            self.references += 1
+            return self._session
+
+    def _release(self):
+        """Drop a reference and return the session if it was the last one."""
+        with self._lock:
+            if not self.references:
+                raise RuntimeError("Released more often than acquired")
+            self.references -= 1
+            if self.references:
+                return None
+            session, self._session = self._session, None
+            return session
+
+
+class SharedSession(SharedSessionBase):
+    """A session shared by many Cleverbots.
+
+    The session is created when the first Cleverbot acquires it and closed
+    once the last one releases it, so closing one Cleverbot doesn't break the
+    others. Pass it into Cleverbot as shared, or pass shared=True to use the
+    process-wide default_session.
+    """
+
+    def __init__(self, factory=create_session):
+        """Initialize the shared session.
+
+        Arguments:
+            factory: A callable that creates the requests.Session to share.
+        """
+        super(SharedSession, self).__init__()
+        self.factory = factory
+
+    def acquire(self):
+        """Get the session, creating it if necessary, and take a reference
+        to it.
+        """
+        return self._acquire(self.factory)
+
+    def release(self):
+        """Drop a reference to the session, closing it after the last one."""
+        session = self._release()
+        if session is not None:
+            session.close()
+
+
+default_session = SharedSession()
@@ -5,7 +5,7 @@ import pickle
 import sys
 from distutils.version import StrictVersion
 
-from .migrations import migrations
+from .migrations import migrations, plans
 
 
 class GenericUnpickler(pickle.Unpickler, object):  # Old-style class on py2
@@ -54,8 +54,17 @@ def keyword_only(kwonly_start):
 def convo_property(name):
     _name = '_' + name
     getter = lambda self: getattr(self, _name, getattr(self.cleverbot, name))
-    setter = lambda self, value: setattr(self, _name, value)
-    deleter = lambda self: delattr(self, _name)
+
+    def setter(self, value):
+        setattr(self, _name, value)
+        self._template = None
+        self._touch()
+
+    def deleter(self):
+        delattr(self, _name)
+        self._template = None
+        self._touch()
+
     return property(getter, setter, deleter)
 
 
@@ -93,6 +102,19 @@ def get_slots(cls):
 
 
 def get_migrations(version, target, cls=None):
+    """Get the migrations that take a state from version to target, in the
+    order they have to be applied. Plans are cached as tuples in
+    migrations.plans.
+    """
+    key = (version, target, cls)
+    try:
+        return plans[key]
+    except KeyError:
+        plan = plans[key] = tuple(_get_migrations(version, target, cls))
+        return plan
+
+
+def _get_migrations(version, target, cls=None):
     version, target = map(StrictVersion, [version, target])
     if version == target:
         return []
@@ -0,0 +1,138 @@
+import threading
+
+from .errors import QueueFull
+
+try:
+    from concurrent.futures import Future
+except ImportError:  # Python 2 without the futures backport
+    Future = None
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+
+class WorkerPool(object):
+    """A fixed number of threads that serve requests from a bounded queue.
+
+    What happens when the queue is full depends on the overflow policy:
+    ``'block'`` waits for room (up to ``timeout`` seconds), ``'raise'`` raises
+    QueueFull right away and ``'shed'`` drops the oldest queued request,
+    failing it with QueueFull, to make room for the new one.
+    """
+
+    def __init__(self, workers=4, maxsize=100, overflow='block',
+                 timeout=None):
+        """Initialize the pool with the given arguments.
+
+        Arguments:
+            workers: How many threads to serve the requests with.
+            maxsize: How many requests can be queued at once.
+            overflow: What to do when the queue is full, either 'block',
+                'raise' or 'shed'.
+            timeout: How many seconds to wait for room when blocking before
+                raising QueueFull. If None wait indefinitely.
+        """
+        if overflow not in ('block', 'raise', 'shed'):
+            raise ValueError("Unknown overflow policy {!r}".format(overflow))
+        if Future is None:
+            raise RuntimeError("WorkerPool requires the futures backport on "
+                               "Python 2")
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    @property
+    def queued(self):
+        """How many requests are waiting to be served."""
+        return self._queue.qsize()
+
+    def submit(self, func, *args, **kwargs):
+        """Queue a call to func with the given arguments.
+
+        Returns:
+            A concurrent.futures.Future for the result of the call.
+
+        Raises:
+            QueueFull: The queue is full.
+        """
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Can't submit to a pool that's shut down")
+            if not self._threads:
+                self._start()
+
+        future = Future()
+        item = (future, func, args, kwargs)
+        if self.overflow == 'block':
+            try:
+                self._queue.put(item, timeout=self.timeout)
+            except queue.Full:
+                raise QueueFull("Timed out waiting for room in the queue")
+        elif self.overflow == 'raise':
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                raise QueueFull("The queue is full")
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    try:
+                        dropped = self._queue.get_nowait()[0]
+                    except queue.Empty:
+                        continue
+                    # It may have been cancelled while it was queued
+                    if dropped.set_running_or_notify_cancel():
+                        dropped.set_exception(QueueFull(
+                            "Dropped to make room for a newer request"))
+                else:
+                    break
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop the threads after the queued requests have been served.
+
+        Arguments:
+            wait: Whether to wait for the threads to stop.
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            threads = self._threads
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            future, func, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
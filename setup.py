@@ -30,7 +30,8 @@ setup(
     author='orlnub123',
     license='MIT',
     packages=['cleverbot', 'cleverbot.async_'],
-    install_requires=['requests>=1.0.0'],
+    install_requires=['requests>=1.0.0',
+                      'futures>=2.0.0; python_version<"3.2"'],
     extras_require={'async': ['aiohttp>=1.0.0']},
     python_requires='>=2.7, !=3.0.*, !=3.1.*',
     setup_requires=pytest_runner,
@@ -1,5 +1,7 @@
 import asyncio
+import concurrent.futures
 import io
+import socket
 
 import pytest
 
@@ -76,6 +78,59 @@ class TestCleverbot:
         assert cb.cs == 'test'
         yield from cb.close()
 
+    @pytest.mark.asyncio
+    def test_say_deadline(self, cb):
+        with pytest.raises(cleverbot.DeadlineExceeded) as info:
+            yield from cb.say(deadline=0)
+        assert info.value.phase == 'queue'
+
+    def test_lazy_session(self):
+        cb = cleverbot.Cleverbot('API_KEY')
+        assert cb._session is None
+
+    @pytest.mark.asyncio
+    def test_async_with(self):
+        cb = cleverbot.Cleverbot('API_KEY')
+        assert (yield from cb.__aenter__()) is cb
+        session = cb.session
+        yield from cb.__aexit__(None, None, None)
+        assert session.closed
+        assert cb._session is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('cb', [{}], indirect=True)
+    @asyncio.coroutine
+    def test_chat_many_stop(self, cb):
+        streams = {cb.conversation(str(i)): ['a', 'b', 'c'] for i in range(4)}
+        chats = cb.chat_many(streams, concurrency=2)
+        yield from chats.__anext__()
+        tasks = list(chats._tasks)
+        yield from chats.aclose()
+        assert all(task.done() for task in tasks)
+
+        chats = cb.chat_many(streams, concurrency=2)
+        yield from chats.__anext__()
+        tasks = list(chats._tasks)
+        del chats
+        yield from asyncio.sleep(0)
+        assert all(task.done() for task in tasks)
+
+    @pytest.mark.asyncio
+    def test_say_unreachable(self, cb):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        cb.url = 'http://127.0.0.1:{}/getreply'.format(sock.getsockname()[1])
+        sock.close()  # Nothing listens on the port anymore
+        cb.breaker = cleverbot.CircuitBreaker(window=1, min_calls=1)
+        cb.fallback = cleverbot.ReplyCorpus(default='sorry')
+        reply = yield from cb.say("Hello")
+        assert reply == 'sorry'
+        assert reply.degraded
+        assert cb.breaker.state(cb.key, cb.url) == 'open'
+        cb.breaker = cb.fallback = None
+        with pytest.raises(cleverbot.TransportError):
+            yield from cb.say("Hello")
+
     def test_getattr(self, cb):
         cb.data = {'test': 'value'}
         assert cb.test == 'value'
@@ -382,3 +437,57 @@ class TestIO:
             for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
                 assert getattr(convo1, item) == getattr(convo2, item)
         yield from cb.close()
+
+
+class TestThreadedCleverbot:
+
+    @pytest.fixture
+    def cb(self):
+        from cleverbot.__main__ import FakeServer
+        with FakeServer() as server:
+            cb = cleverbot.ThreadedCleverbot('API_KEY', tweak1=25)
+            cb.url = server.url
+            yield cb
+            cb.close()
+
+    def test_say(self, cb):
+        assert cb.say("Hello") == "Hello"
+        assert cb.cs == '5'
+        convo = cb.conversation('name', tweak1=50)
+        assert convo.say("Hi") == "Hi"
+        assert convo.cs == '2'
+        future = convo.submit("Hey")
+        assert isinstance(future, concurrent.futures.Future)
+        assert future.result(5) == "Hey"
+        assert convo.cs == '23'
+
+    def test_say_many(self, cb):
+        convos = [cb.conversation(str(i)) for i in range(5)]
+        requests = [(convo, 'x' * i) for i, convo in enumerate(convos, 1)]
+        replies = cb.say_many(requests + [(cb, 'cb')])
+        assert replies == ['x' * i for i in range(1, 6)] + ['cb']
+        assert [convo.cs for convo in convos] == ['1', '2', '3', '4', '5']
+
+    def test_getattr(self, cb):
+        assert cb.url == cb.cleverbot.url
+        cb.tweak1 = 50
+        assert cb.cleverbot.tweak1 == 50
+        convo = cb.conversation('name', cs='cs', tweak1=10)
+        assert convo.tweak1 == 10
+        del convo.tweak1
+        assert convo.tweak1 == 50
+        assert convo.name == 'name'
+        assert convo.cleverbot is cb.cleverbot
+        assert cb.conversations['name'] is convo._target
+        convo.reset()
+        assert convo.cs is None
+        cb.warmup()
+
+    def test_close(self, cb):
+        cb.say()
+        session = cb.session
+        cb.close()
+        assert cb._loop.is_closed()
+        assert not cb._thread.is_alive()
+        assert session.closed
+        cb.close()
@@ -1,10 +1,23 @@
+import collections
+import contextlib
 import io
+import json
+import pickle
+import socket
+import sys
+import threading
+import time
 
 import pytest
 import requests
 
 import cleverbot
 
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
 
 @pytest.fixture
 def cb(request, monkeypatch):
@@ -31,6 +44,57 @@ def cb(request, monkeypatch):
     return cb
 
 
+class MockAPI(object):
+    """Replies to the requests sent by a client in place of the API.
+
+    Statuses appended to ``statuses`` script the next replies, with None
+    timing out; the API replies with 200 and echoes the input once they
+    run out. Every request sent is recorded, prepared, in ``sent``.
+    """
+
+    def __init__(self):
+        self.statuses = []
+        self.sent = []
+
+    def get(self, url, params, timeout, **kwargs):
+        self.sent.append(requests.Request('GET', url, params=params).prepare())
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status is None:
+            raise requests.ReadTimeout
+        if status == 200:
+            data = {'output': params.get('input', 'test'),
+                    'cs': params.get('cs', 'new')}
+        else:
+            data = {'error': 'error', 'status': status}
+        return self.Response(status, data)
+
+    class Response(object):
+
+        def __init__(self, status, data):
+            self.status_code = status
+            self.data = data
+
+        def json(self):
+            return self.data
+
+        @property
+        def raw(self):
+            body = io.BytesIO(json.dumps(self.data).encode('utf-8'))
+            read1 = lambda amt, decode_content=False: body.read1(amt)
+            return type('Raw', (object,), {
+                'read1': staticmethod(read1), '_fp': body})()
+
+        def close(self):
+            pass
+
+
+@pytest.fixture
+def api(cb, monkeypatch):
+    api = MockAPI()
+    monkeypatch.setattr(cb.session, 'get', api.get)
+    return api
+
+
 @pytest.fixture
 def cb_nameless():
     cb = cleverbot.Cleverbot('API_KEY', cs='76nxdxIJ02AAA', timeout=60,
@@ -137,6 +201,105 @@ class TestCleverbot:
                 assert e.timeout == cb.timeout
                 raise
 
+    def test_say_timeouts(self, cb, monkeypatch):
+        timeouts = []
+
+        def mock_get(url, params, timeout):
+            timeouts.append(timeout)
+            raise requests.ConnectTimeout
+        monkeypatch.setattr(cb.session, 'get', mock_get)
+        cb.connect_timeout = 5
+        with pytest.raises(cleverbot.Timeout) as info:
+            cb.say()
+        assert info.value.phase == 'connect'
+        assert info.value.timeout == 5
+        assert 'while connecting' in str(info.value)
+        convo = cb.conversation(read_timeout=30)
+        with pytest.raises(cleverbot.Timeout):
+            convo.say()
+        assert timeouts == [(5, 60), (5, 30)]
+
+    def test_say_deadline(self, cb, monkeypatch):
+        timeouts = []
+
+        def mock_get(url, params, timeout, **kwargs):
+            timeouts.append(timeout)
+            raise requests.ReadTimeout
+        monkeypatch.setattr(cb.session, 'get', mock_get)
+        cb.connect_timeout = 1
+        with pytest.raises(cleverbot.DeadlineExceeded) as info:
+            cb.say(deadline=2)
+        assert info.value.phase == 'read'
+        assert len(timeouts) == 1
+        assert timeouts[0].connect_timeout == 1
+        assert timeouts[0].total == pytest.approx(2, abs=0.1)
+        assert 'deadline' not in cb._get_params(None, {})
+        with pytest.raises(cleverbot.DeadlineExceeded) as info:
+            cb.say(deadline=0)
+        assert info.value.phase == 'queue'
+        assert len(timeouts) == 1
+
+    @pytest.fixture
+    def slow_server(self):
+        from cleverbot.__main__ import FakeServer
+
+        class Handler(FakeServer.Handler):
+
+            def do_GET(self):
+                if 'slow' in self.path:
+                    delays = (0, 0.05)  # Drip the body
+                elif 'late' in self.path:
+                    delays = (0.45, 0.45)  # Late headers, then a late body
+                else:
+                    return FakeServer.Handler.do_GET(self)
+                body = json.dumps({'output': 'slow', 'cs': 'cs'})
+                try:
+                    time.sleep(delays[0])
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.flush()
+                    if 'late' in self.path:
+                        time.sleep(delays[1])
+                        self.wfile.write(body.encode('ascii'))
+                        return
+                    for char in body:
+                        self.wfile.write(char.encode('ascii'))
+                        self.wfile.flush()
+                        time.sleep(delays[1])
+                except socket.error:
+                    pass
+
+        with FakeServer() as server:
+            server.RequestHandlerClass = Handler
+            yield server
+
+    def test_say_deadline_body(self, cb, slow_server):
+        cb.url = slow_server.url
+        assert cb.say("Hello", deadline=5) == "Hello"
+        cs = cb.cs
+        start = time.time()
+        with pytest.raises(cleverbot.DeadlineExceeded) as info:
+            cb.say("slow", deadline=0.3)
+        assert time.time() - start < 0.8
+        assert info.value.phase == 'read'
+        assert cb.cs == cs
+
+    def test_say_deadline_total(self, cb, slow_server):
+        cb.url = slow_server.url
+        cb.say("Hello", deadline=5)  # Connect ahead of time
+        start = time.time()
+        with pytest.raises(cleverbot.DeadlineExceeded) as info:
+            cb.say("late", deadline=0.5)
+        assert time.time() - start <= 0.5 + 0.1
+        assert info.value.phase == 'read'
+        cb.read_timeout = 0.2
+        start = time.time()
+        with pytest.raises(cleverbot.Timeout) as info:
+            cb.say("late", deadline=5)
+        assert time.time() - start <= 0.2 + 0.1
+        assert not isinstance(info.value, cleverbot.DeadlineExceeded)
+
     def test_conversation_empty(self, cb):
         convo = cb.conversation()
         assert convo.key == cb.key
@@ -187,6 +350,54 @@ class TestCleverbot:
             for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
                 assert getattr(convo1, item) == getattr(convo2, item)
 
+    def test_conversations_from_named(self, cb):
+        records = [(s, s*2, s, i, (i, i+5, i+10))
+                   for i, s in enumerate(map(str, range(200)))]
+        generation = cb.generation
+        convos = cb.conversations_from(records)
+        assert len(convos) == len(cb.conversations) == 200
+        assert cb.changes(generation) == convos
+        for name, cs, key, timeout, tweaks in records:
+            convo = cb.conversations[name]
+            assert convo.name == name
+            assert convo.session is cb.session
+            assert (convo.cs, convo.key, convo.timeout) == (cs, key, timeout)
+            assert (convo.tweak1, convo.tweak2, convo.tweak3) == tweaks
+        generation = cb.generation
+        with pytest.raises(ValueError):
+            cb.conversations_from([('new', 'cs', None, None, None),
+                                   ('new', 'other', None, None, None)])
+        assert 'new' not in cb.conversations
+        assert not cb.changes(generation)
+
+    def test_conversations_from_nameless(self, cb):
+        convo1, convo2 = cb.conversations_from(
+            [(None, None, None, None, None), (None, 'cs', 'key', 10, None)])
+        assert set(cb.conversations) == {convo1, convo2}
+        assert convo1.cs is None
+        for item in ('key', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
+            assert getattr(convo1, item) == getattr(cb, item)
+        assert (convo2.cs, convo2.key, convo2.timeout) == ('cs', 'key', 10)
+        generation = cb.generation
+        with pytest.raises(TypeError):
+            cb.conversations_from([('name', None, None, None, None)])
+        with pytest.raises(ValueError):
+            cb.conversations_from([(None, None, None, None, None),
+                                   ('name', None, None, None, None)])
+        assert cb.generation == generation
+        assert not cb.changes(generation)
+        assert set(cb.conversations) == {convo1, convo2}
+
+    def test_conversations_from_timeouts(self, cb):
+        cb.read_timeout = 30
+        convo1, convo2 = cb.conversations_from([
+            ('1', None, None, (None, 5, None), None),
+            ('2', None, None, (10, 2, 20), None)])
+        assert (convo1.timeout, convo1.connect_timeout,
+                convo1.read_timeout) == (60, 5, 30)
+        assert (convo2.timeout, convo2.connect_timeout,
+                convo2.read_timeout) == (10, 2, 20)
+
     def test_reset_nameless(self, cb_nameless):
         cb_nameless.reset()
         assert not cb_nameless.data
@@ -199,6 +410,499 @@ class TestCleverbot:
         for convo in cb_named.conversations.values():
             assert not convo.data
 
+    def test_warmup(self, cb, monkeypatch):
+        heads = []
+
+        def mock_head(url, timeout, stream):
+            heads.append(url)
+
+            class MockResponse(object):
+                content = b''
+
+            return MockResponse()
+        monkeypatch.setattr(socket, 'getaddrinfo', lambda *args: [])
+        monkeypatch.setattr(cb.session, 'head', mock_head)
+        assert cb.warmup(3) >= 0
+        assert heads == [cb.url] * 3
+
+    def test_warmup_pool(self, cb, monkeypatch):
+        class MockResponse(object):
+            content = b''
+        monkeypatch.setattr(socket, 'getaddrinfo', lambda *args: [])
+        monkeypatch.setattr(cb.session, 'head',
+                            lambda url, timeout, stream: MockResponse())
+        cb.warmup(20)
+        adapter = cb.session.get_adapter(cb.url)
+        assert adapter._pool_maxsize == 20
+        cb.warmup(20)
+        cb.warmup(5)
+        assert cb.session.get_adapter(cb.url) is adapter
+        cb.warmup(30)
+        assert cb.session.get_adapter(cb.url)._pool_maxsize == 30
+        assert adapter not in cb.session.adapters.values()
+
+        session = requests.Session()
+        monkeypatch.setattr(session, 'head',
+                            lambda url, timeout, stream: MockResponse())
+        cb2 = cleverbot.Cleverbot('API_KEY', session=session)
+        adapter = session.get_adapter(cb2.url)
+        cb2.warmup(20)
+        assert session.get_adapter(cb2.url) is adapter
+
+    def test_warmup_timeout(self, cb, monkeypatch):
+        def mock_head(url, timeout, stream):
+            raise requests.Timeout
+        monkeypatch.setattr(socket, 'getaddrinfo', lambda *args: [])
+        monkeypatch.setattr(cb.session, 'head', mock_head)
+        with pytest.raises(cleverbot.Timeout):
+            cb.warmup()
+
+    def test_session(self):
+        session = requests.Session()
+        cb = cleverbot.Cleverbot('API_KEY', session=session)
+        assert cb.session is session
+        assert cb.conversation().session is session
+        closed = []
+        session.close = lambda: closed.append(session)
+        cb.close()
+        assert not closed
+        with pytest.raises(TypeError):
+            cleverbot.Cleverbot('API_KEY', session=session, shared=True)
+
+    def test_shared_session(self):
+        shared = cleverbot.SharedSession()
+        cb1 = cleverbot.Cleverbot('API_KEY', shared=shared)
+        cb2 = cleverbot.Cleverbot('API_KEY', shared=shared)
+        assert shared.references == 0
+        session = cb1.session
+        assert cb2.session is session
+        assert shared.references == 2
+        closed = []
+        session.close = lambda: closed.append(True)
+        cb1.close()
+        assert not closed
+        cb2.close()
+        assert closed and shared.references == 0
+        cb3 = cleverbot.Cleverbot('API_KEY', shared=shared)
+        assert cb3.session is not session
+        cb3.close()
+
+    def test_shared_session_default(self):
+        cb1 = cleverbot.Cleverbot('API_KEY', shared=True)
+        cb2 = cleverbot.Cleverbot('API_KEY', shared=True)
+        assert cb1.session is cb2.session
+        cb1.close()
+        cb2.close()
+
+
+class TestTracing:
+
+    class Tracer(object):
+
+        def __init__(self):
+            self.spans = []
+
+        @contextlib.contextmanager
+        def start_as_current_span(self, name):
+            span = type('Span', (object,), {})()
+            span.name = name
+            span.attributes = {}
+            span.set_attribute = span.attributes.__setitem__
+            self.spans.append(span)
+            yield span
+
+    @pytest.mark.parametrize('cb', [{}], indirect=True)
+    def test_span(self, cb):
+        cb.tracer = self.Tracer()
+        convo = cb.conversation('name', cs='cs', tweak2=10)
+        convo.say()
+        span, = cb.tracer.spans
+        assert span.name == 'cleverbot.say'
+        assert span.attributes == {
+            'cleverbot.conversation': 'name', 'cleverbot.cs_size': 2,
+            'cleverbot.tweak1': 25, 'cleverbot.tweak2': 10,
+            'cleverbot.tweak3': 75, 'http.status_code': 200,
+            'cleverbot.request_size': convo.request_size
+        }
+
+    @pytest.mark.parametrize('cb', [{'status': 401}], indirect=True)
+    def test_span_error(self, cb):
+        cb.tracer = self.Tracer()
+        with pytest.raises(cleverbot.APIError):
+            cb.say()
+        assert cb.tracer.spans[0].attributes['http.status_code'] == 401
+
+
+class TestCircuitBreaker:
+
+    def test_open(self, cb, api):
+        changes = []
+        cb.breaker = cleverbot.CircuitBreaker(
+            threshold=0.5, window=4, min_calls=4, cooldown=60,
+            on_change=lambda *args: changes.append(args))
+        api.statuses.extend([200, 503, None, 500])
+        cb.say()
+        for _ in range(3):
+            with pytest.raises(cleverbot.CleverbotError):
+                cb.say()
+        assert cb.breaker.state(cb.key, cb.url) == 'open'
+        with pytest.raises(cleverbot.CircuitOpen) as info:
+            cb.say()
+        assert 0 < info.value.retry_after <= 60
+        assert len(api.sent) == 4
+        assert cb.breaker.rejected == 1
+        assert changes == [((cb.key, cb.url), 'closed', 'open')]
+        with pytest.raises(cleverbot.CircuitOpen):
+            cb.conversation().say()
+
+    def test_client_errors(self, cb, api):
+        cb.breaker = cleverbot.CircuitBreaker(window=2, min_calls=2)
+        api.statuses.extend([401, 401, 401])
+        for _ in range(3):
+            with pytest.raises(cleverbot.APIError):
+                cb.say()
+        with pytest.raises(cleverbot.DeadlineExceeded):
+            cb.say(deadline=0)
+        assert cb.breaker.state(cb.key, cb.url) == 'closed'
+
+    def test_probe(self, cb, api):
+        cb.breaker = cleverbot.CircuitBreaker(window=2, min_calls=2,
+                                              cooldown=0)
+        api.statuses.extend([500, 500, 500])
+        for _ in range(3):
+            with pytest.raises(cleverbot.APIError):
+                cb.say()
+        assert cb.breaker.state(cb.key, cb.url) == 'open'
+        assert cb.say() == 'test'
+        assert cb.breaker.state(cb.key, cb.url) == 'closed'
+        assert cb.breaker.transitions == collections.Counter({
+            ('closed', 'open'): 1, ('open', 'half-open'): 2,
+            ('half-open', 'open'): 1, ('half-open', 'closed'): 1
+        })
+
+    def test_probe_limit(self, cb):
+        breaker = cleverbot.CircuitBreaker(window=1, min_calls=1, cooldown=0)
+        breaker.exit(breaker.enter('key', 'url'), cleverbot.Timeout())
+        token = breaker.enter('key', 'url')
+        with pytest.raises(cleverbot.CircuitOpen):
+            breaker.enter('key', 'url')
+        breaker.exit(token)
+        assert breaker.state('key', 'url') == 'closed'
+
+    def test_probe_uncounted(self):
+        breaker = cleverbot.CircuitBreaker(window=1, min_calls=1, cooldown=0)
+        breaker.exit(breaker.enter('key', 'url'), cleverbot.Timeout())
+        for error in (cleverbot.DeadlineExceeded(), cleverbot.DecodeError(),
+                      cleverbot.APIError(status=401), KeyboardInterrupt()):
+            breaker.exit(breaker.enter('key', 'url'), error)
+            assert breaker.state('key', 'url') == 'half-open'
+        breaker.exit(breaker.enter('key', 'url'))
+        assert breaker.state('key', 'url') == 'closed'
+
+    def test_scope(self, cb, api):
+        cb.breaker = cleverbot.CircuitBreaker(window=1, min_calls=1)
+        api.statuses.append(500)
+        with pytest.raises(cleverbot.APIError):
+            cb.say()
+        with pytest.raises(cleverbot.CircuitOpen):
+            cb.say()
+        assert cb.conversation(key='other').say() == 'test'
+        assert cb.breaker.state('other', cb.url) == 'closed'
+
+
+class TestFallback:
+
+    def test_fallback(self, cb, api):
+        cb.fallback = cleverbot.ReplyCorpus()
+        reply = cb.say("Hello")
+        assert reply == 'Hello'
+        assert not getattr(reply, 'degraded', False)
+        api.statuses.extend([None, 503])
+        cs = cb.cs
+        for input in ("hello!", "  HELLO "):
+            reply = cb.say(input)
+            assert reply == 'Hello'
+            assert isinstance(reply, cleverbot.DegradedReply)
+            assert reply.degraded
+        assert cb.cs == cs
+        with pytest.raises(cleverbot.APIError):
+            api.statuses.append(500)
+            cb.say("Goodbye")
+        assert cb.fallback.hits == 2
+        assert cb.fallback.misses == 1
+
+    def test_default(self, cb, api):
+        cb.fallback = cleverbot.ReplyCorpus(default='...')
+        api.statuses.append(None)
+        convo = cb.conversation()
+        assert convo.say("Hello").degraded
+        assert convo.cs is None
+
+    def test_budget(self, cb, api, monkeypatch):
+        timeouts = []
+        get = cb.session.get
+
+        def mock_get(url, params, timeout, **kwargs):
+            timeouts.append(timeout)
+            return get(url, params, timeout, **kwargs)
+        monkeypatch.setattr(cb.session, 'get', mock_get)
+        cb.fallback = cleverbot.ReplyCorpus(budget=2)
+        cb.say("Hello")
+        cb.say("Hello", deadline=1)
+        totals = [timeout.total for timeout in timeouts]
+        assert totals == pytest.approx([2, 1], abs=0.1)
+        assert cb.say("Hello", deadline=0).degraded
+
+    def test_budget_breaker(self, cb, api):
+        cb.breaker = cleverbot.CircuitBreaker(window=1, min_calls=1)
+        cb.fallback = cleverbot.ReplyCorpus(budget=1, default='...')
+        api.statuses.append(None)
+        assert cb.say("Hello", deadline=0.5).degraded
+        assert cb.breaker.state(cb.key, cb.url) == 'closed'
+        api.statuses.append(None)
+        assert cb.say("Hello").degraded
+        assert cb.breaker.state(cb.key, cb.url) == 'open'
+        cb.fallback = None
+        with pytest.raises(cleverbot.CircuitOpen):
+            cb.say("Hello")
+
+    def test_unreachable(self, cb):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        cb.url = 'http://127.0.0.1:{}/getreply'.format(sock.getsockname()[1])
+        sock.close()  # Nothing listens on the port anymore
+        cb.breaker = cleverbot.CircuitBreaker(window=1, min_calls=1)
+        cb.fallback = cleverbot.ReplyCorpus(default='sorry')
+        reply = cb.say("Hello")
+        assert reply == 'sorry'
+        assert reply.degraded
+        assert cb.breaker.state(cb.key, cb.url) == 'open'
+        cb.breaker = cb.fallback = None
+        with pytest.raises(cleverbot.TransportError):
+            cb.say("Hello")
+
+    def test_circuit_open(self, cb, api):
+        cb.breaker = cleverbot.CircuitBreaker(window=1, min_calls=1)
+        cb.fallback = cleverbot.ReplyCorpus(default='...')
+        api.statuses.append(500)
+        assert cb.say("Hello").degraded
+        assert cb.say("Hello").degraded
+        assert not api.statuses
+
+    def test_corpus(self):
+        corpus = cleverbot.ReplyCorpus(maxsize=2)
+        corpus.record("a", "1")
+        corpus.record("b", "2")
+        corpus.record("A?", "3")
+        corpus.record("c", "4")
+        corpus.record(None, None)
+        assert len(corpus) == 2
+        assert corpus.reply("b") is None
+        assert corpus.reply("a") == "3"
+        corpus = pickle.loads(pickle.dumps(corpus))
+        assert corpus.reply("c") == "4"
+
+
+class TestAdmissionController:
+
+    def test_limit(self):
+        admission = cleverbot.AdmissionController(limit=1, timeout=0.01)
+        assert admission.enter() is None
+        with pytest.raises(cleverbot.Overloaded):
+            admission.enter()
+        with pytest.raises(cleverbot.DeadlineExceeded):
+            admission.enter(deadline=0.005)
+        admission.exit()
+        assert 0 < admission.enter(deadline=1) <= 1
+        assert admission.admitted == 2
+        assert admission.rejected == 1
+
+    def test_wait(self):
+        admission = cleverbot.AdmissionController(limit=1)
+        admission.enter()
+        timer = threading.Timer(0.01, admission.exit)
+        timer.start()
+        admission.enter()
+        timer.join()
+        assert admission.active == 1
+
+    def test_overloaded(self):
+        admission = cleverbot.AdmissionController(
+            limit=1, target=0.001, interval=0.01, timeout=0.02)
+        admission.enter()
+        for _ in range(2):
+            with pytest.raises(cleverbot.Overloaded):
+                admission.enter()
+            time.sleep(0.01)
+        assert admission.overloaded
+        start = time.time()
+        with pytest.raises(cleverbot.Overloaded):
+            admission.enter()
+        assert time.time() - start < 0.015
+        admission.exit()
+        admission.enter()
+        time.sleep(0.01)
+        admission.exit()
+        admission.enter()
+        assert not admission.overloaded
+
+    @pytest.mark.parametrize('cb', [{}], indirect=True)
+    def test_say(self, cb):
+        cb.admission = cleverbot.AdmissionController(limit=1, timeout=0)
+        assert cb.say() == 'test'
+        assert cb.admission.active == 0
+        cb.admission.enter()
+        with pytest.raises(cleverbot.Overloaded):
+            cb.conversation().say()
+        cb.fallback = cleverbot.ReplyCorpus(default='...')
+        assert cb.say().degraded
+
+
+class TestSizeGuard:
+
+    def test_request_size(self, cb, api):
+        cb.say()
+        assert cb.request_size is None
+        cb.guard = cleverbot.SizeGuard(warn=None, limit=None)
+        cb.say()
+        cb.cs = 'a+b/c d=\u00e9' * 10
+        convo = cb.conversation(cs='76nxdxIJ02AAA', tweak1=50)
+        for talker in (cb, convo):
+            talker.say("Hi, \u00e9 & you?")
+            assert talker.request_size == len(api.sent[-1].url)
+            talker.say("Hi", cb_settings_tweak2=25, wrapper=None)
+            assert talker.request_size == len(api.sent[-1].url)
+            talker.say()
+            assert talker.request_size == len(api.sent[-1].url)
+        convo.tweak1 = 75.5
+        convo.say()
+        assert convo.request_size == len(api.sent[-1].url)
+        assert convo.request_size < cb.request_size
+        assert 'request_size' not in convo.__getstate__()
+
+    def test_warn(self, cb, api):
+        cb.guard = cleverbot.SizeGuard(warn=1, limit=None)
+        with pytest.warns(cleverbot.RequestSizeWarning):
+            cb.say()
+        assert cb.guard.warned == 1
+        assert cb.guard.largest == cb.request_size
+
+    def test_raise(self, cb, api):
+        cb.guard = cleverbot.SizeGuard(warn=None, limit=200)
+        convo = cb.conversation(cs='a' * 200)
+        with pytest.raises(cleverbot.RequestTooLarge) as info:
+            convo.say()
+        assert info.value.size > 200
+        assert not api.sent
+        cb.say()
+        assert cb.guard.raised == 1
+
+    def test_reset(self, cb, api):
+        cb.guard = cleverbot.SizeGuard(warn=None, limit=200, action='reset')
+        convo = cb.conversation('name', cs='a' * 200)
+        convo.data['output'] = 'output'
+        generation = cb.generation
+        convo.say()
+        assert 'cs' not in api.sent[0].url
+        assert convo.cs == 'new'
+        assert convo.request_size < 200
+        assert cb.guard.reset == 1
+        assert convo in cb.changes(generation)
+
+    def test_policy(self, cb, api):
+        calls = []
+
+        def policy(convo, size, action):
+            calls.append((convo, size, action))
+            return None
+        cb.guard = cleverbot.SizeGuard(warn=1, limit=2, policy=policy)
+        cb.say()
+        assert calls == [(cb, cb.request_size, 'raise')]
+        assert len(api.sent) == 1
+
+
+class TestChanges:
+
+    def test_generation(self, cb):
+        generation = cb.generation
+        cb.cs = 'test'
+        assert cb.generation > generation
+        assert cb.modified == cb.generation
+
+    @pytest.mark.parametrize(
+        'cb', [{'json': {'output': 'test', 'cs': 'cs'}}], indirect=True)
+    def test_changes(self, cb):
+        convos = [cb.conversation(str(i)) for i in range(10)]
+        marker = cb.generation
+        assert not cb.changes(marker)
+        convos[5].say()
+        convos[2].reset()
+        convos[8].tweak1 = 50
+        assert cb.changes(marker) == [convos[5], convos[2], convos[8]]
+        assert cb.changes() == convos[:2] + convos[3:5] + convos[6:8] + [
+            convos[9], convos[5], convos[2], convos[8]]
+
+    def test_changes_nameless(self, cb):
+        marker = cb.generation
+        convo = cb.conversation()
+        assert cb.changes(marker) == [convo]
+        del convo
+        assert not cb.changes(marker)
+        assert not cb._changes
+
+    def test_changes_threads(self, cb_named):
+        convos = list(cb_named.conversations.values())
+        stop = threading.Event()
+        errors = []
+
+        def touch():
+            try:
+                while not stop.is_set():
+                    for convo in convos:
+                        convo.cs = 'test'
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=touch) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        generation = cb_named.generation
+        try:
+            deadline = time.time() + 0.5
+            while time.time() < deadline:
+                cb_named.changes()
+                cb_named.clear_changes(cb_named.generation - 100)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        assert not errors
+        touched = cb_named.generation - generation
+        before = cb_named.generation
+        for convo in convos:
+            convo.cs = 'test'
+        assert cb_named.generation == before + len(convos)
+        assert touched > 0
+        assert cb_named.changes(before) == convos
+
+    def test_clear_changes(self, cb_named):
+        marker = cb_named.generation
+        cb_named.conversations['1'].cs = 'test'
+        cb_named.clear_changes(marker)
+        assert cb_named.changes() == [cb_named.conversations['1']]
+        cb_named.clear_changes()
+        assert not cb_named.changes()
+
+    def test_load(self, cb, cb_named):
+        with io.BytesIO() as f:
+            cb_named.save(f)
+            with io.BytesIO(f.getvalue()) as f:
+                cb2 = cleverbot.load(f)
+                f.seek(0)
+                cb.load(f)
+        assert not cb2.changes()
+        assert cb2.conversations['0'].name == '0'
+        assert len(cb.changes()) == len(cb_named.conversations)
+
 
 class TestConversation:
 
@@ -306,6 +1010,20 @@ class TestConversation:
         convo.reset()
         assert not convo.data
 
+    def test_params_settings(self, cb):
+        convo = cb.conversation(tweak2=10)
+        convo._get_params(None, {})
+        cb.key = 'key'
+        cb.tweak1 = 5
+        convo.tweak2 = 20
+        assert convo._get_params('test', {}) == {
+            'input': 'test', 'key': 'key', 'wrapper': 'cleverbot.py',
+            'cb_settings_tweak1': 5, 'cb_settings_tweak2': 20,
+            'cb_settings_tweak3': 75
+        }
+        del convo.tweak2
+        assert convo._get_params(None, {})['cb_settings_tweak2'] == 50
+
 
 class TestIO:
 
@@ -346,6 +1064,21 @@ class TestIO:
         for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
             assert getattr(cb2, item) == getattr(cb, item)
 
+    def test_load_session(self, cb_named):
+        with io.BytesIO() as f:
+            cb_named.save(f)
+            with io.BytesIO(f.getvalue()) as f:
+                cb = cleverbot.load(f)
+        assert cb._session is None
+        convo = cb.conversations['0']
+        assert convo.session is cb.session is not None
+        cb2 = cleverbot.Cleverbot('API_KEY')
+        with io.BytesIO() as f:
+            cb_named.save(f)
+            f.seek(0)
+            cb2.load(f)
+        assert cb2.conversations['0'].session is cb2.session
+
     def test_load_conversations(self, cb_named):
         convos = cb_named.conversations
         with io.BytesIO() as f:
@@ -356,3 +1089,557 @@ class TestIO:
             convo2 = convos[name]
             for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
                 assert getattr(convo1, item) == getattr(convo2, item)
+
+    def test_get_migrations_cached(self):
+        from cleverbot.utils import get_migrations
+        plan = get_migrations('2.1.0', '2.5.0')
+        assert isinstance(plan, tuple) and len(plan) == 1
+        assert get_migrations('2.1.0', '2.5.0') is plan
+        assert get_migrations('2.5.0', '2.5.0') == ()
+
+    def test_load_batch(self, cb_named, monkeypatch):
+        from cleverbot import migrations
+        with io.BytesIO() as f:
+            cb_named.save(f)
+            data = f.getvalue()
+        # Pretend it was saved by an older version without migrations
+        data = data.replace(cleverbot.__version__.encode(), b'2.5.9')
+        lookups = []
+        get_migrations = migrations.get_migrations
+
+        def mock_get_migrations(version, target, cls=None):
+            lookups.append((version, cls))
+            return get_migrations(version, target, cls)
+        monkeypatch.setattr(migrations, 'get_migrations', mock_get_migrations)
+        with io.BytesIO(data) as f:
+            cb = cleverbot.load(f)
+        assert len(lookups) == 2
+        assert lookups[0] == ('2.5.9', type(cb.conversations['0']))
+        for name, convo in cb_named.conversations.items():
+            loaded = cb.conversations[name]
+            assert loaded.name == name
+            assert loaded.cleverbot is cb
+            for item in ('key', 'cs', 'timeout'):
+                assert getattr(loaded, item) == getattr(convo, item)
+
+        def regression(state):
+            """Everything will be lost."""
+            return state
+        regression.regression = True
+        monkeypatch.setattr(migrations, 'get_migrations',
+                            lambda *args: (regression,) if args[2] else ())
+        with io.BytesIO(data) as f:
+            with pytest.raises(pickle.UnpicklingError):
+                cleverbot.load(f)
+
+    def test_save_indexed_nameless(self, cb_nameless):
+        with io.BytesIO() as f:
+            with pytest.raises(TypeError):
+                cb_nameless.save_indexed(f)
+
+    def test_indexed_file(self, cb_named, tmpdir):
+        filename = str(tmpdir.join('cleverbot.index'))
+        cb_named.save_indexed(filename)
+        with cleverbot.IndexedFile(filename) as index:
+            assert len(index) == len(cb_named.conversations)
+            assert set(index) == set(cb_named.conversations)
+            assert '0' in index and None not in index
+            assert index.read(None).cs == cb_named.cs
+
+    def test_restore(self, cb, cb_named):
+        with io.BytesIO() as f:
+            cb_named.save_indexed(f)
+            with io.BytesIO(f.getvalue()) as f:
+                convo = cb.restore(f, '5')
+        assert list(cb.conversations) == ['5']
+        assert cb.conversations['5'] is convo
+        assert convo.name == '5'
+        assert convo.session is cb.session
+        for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
+            assert getattr(convo, item) == getattr(
+                cb_named.conversations['5'], item)
+
+    def test_restore_missing(self, cb, cb_named, tmpdir):
+        filename = str(tmpdir.join('cleverbot.index'))
+        cb_named.save_indexed(filename)
+        with pytest.raises(KeyError):
+            cb.restore(filename, 'missing')
+
+    def test_export_columns(self, cb_named, tmpdir):
+        cb_named.conversations['1'].data['output'] = 'caf\xe9'
+        cb_named.conversations['2'].tweak2 = 20
+        filename = str(tmpdir.join('cleverbot.columns'))
+        cb_named.export_columns(filename)
+        with cleverbot.ColumnFile(filename) as columns:
+            assert len(columns) == len(cb_named.conversations)
+            names = columns.field('name')
+            assert set(names) == set(cb_named.conversations)
+            index = names.index('1')
+            assert columns.field('output')[index] == 'caf\xe9'
+            assert columns.field('tweak1')[index] is None
+            assert columns.field('tweak2')[names.index('2')] == 20
+            offsets = columns.column('cs.offsets')
+            data = columns.column('cs.data')
+            assert data[offsets[index]:offsets[index + 1]] == b'1'
+
+    def test_import_columns(self, cb, cb_named):
+        cb_named.conversations['1'].data['output'] = 'output'
+        with io.BytesIO() as f:
+            cb_named.export_columns(f)
+            with io.BytesIO(f.getvalue()) as f:
+                convos = cb.import_columns(f)
+        assert len(convos) == len(cb.conversations) == 200
+        assert cb.conversations['1'].output == 'output'
+        for name, convo1 in cb.conversations.items():
+            convo2 = cb_named.conversations[name]
+            for item in ('key', 'cs', 'timeout', 'tweak1', 'tweak2', 'tweak3'):
+                assert getattr(convo1, item) == getattr(convo2, item)
+
+    def test_export_columns_nameless(self, cb):
+        cb2 = cleverbot.Cleverbot('API_KEY')
+        convos = [cb2.conversation(cs=str(i)) for i in range(10)]
+        with io.BytesIO() as f:
+            cb2.export_columns(f)
+            with io.BytesIO(f.getvalue()) as f:
+                convos = cb.import_columns(f)
+        assert len(convos) == len(cb.conversations) == 10
+        assert all(convo.name is None for convo in convos)
+        assert sorted(convo.cs for convo in convos) == sorted(
+            map(str, range(10)))
+
+    def test_export_columns_timeouts(self, cb):
+        cb2 = cleverbot.Cleverbot('API_KEY')
+        cb2.conversation('split', connect_timeout=2, read_timeout=20)
+        cb2.conversation('total', timeout=10)
+        with io.BytesIO() as f:
+            cb2.export_columns(f)
+            with io.BytesIO(f.getvalue()) as f:
+                cb.import_columns(f)
+        convo = cb.conversations['split']
+        assert (convo.timeout, convo.connect_timeout,
+                convo.read_timeout) == (60, 2, 20)
+        convo = cb.conversations['total']
+        assert (convo.timeout, convo.connect_timeout,
+                convo.read_timeout) == (10, None, None)
+
+    def test_export_columns_tweaks(self, cb):
+        cb2 = cleverbot.Cleverbot('API_KEY')
+        cb2.conversation('float', tweak1=20.5, tweak3=100)
+        cb2.conversation('large', tweak2=40000)
+        with io.BytesIO() as f:
+            cb2.export_columns(f)
+            with io.BytesIO(f.getvalue()) as f:
+                cb.import_columns(f)
+        convo = cb.conversations['float']
+        assert (convo.tweak1, convo.tweak2, convo.tweak3) == (20.5, 50, 100)
+        assert isinstance(convo.tweak3, int)
+        assert cb.conversations['large'].tweak2 == 40000
+
+
+class TestCheckpointer:
+
+    def test_snapshot(self, cb_named):
+        snapshot = cb_named.snapshot()
+        cb_named.cs = 'changed'
+        cb_named.conversations['0'].cs = 'changed'
+        cb_named.conversation('new')
+        assert snapshot.cs == '76nxdxIJ02AAA'
+        assert snapshot.conversations['0'].cs == '0'
+        assert snapshot.conversations['0'].cleverbot is snapshot
+        assert 'new' not in snapshot.conversations
+
+    def test_snapshot_nameless(self, cb_nameless):
+        snapshot = cb_nameless.snapshot()
+        assert len(snapshot.conversations) == len(cb_nameless.conversations)
+
+    def test_checkpoint(self, cb_named, tmpdir):
+        filename = str(tmpdir.join('cleverbot.pickle'))
+        checkpointer = cleverbot.Checkpointer(cb_named, filename)
+        checkpointer.checkpoint()
+        cb = cleverbot.load(filename)
+        for name, convo in cb.conversations.items():
+            assert convo.cs == cb_named.conversations[name].cs
+
+    def test_checkpoint_keep(self, cb, tmpdir):
+        filename = str(tmpdir.join('cleverbot.pickle'))
+        checkpointer = cleverbot.Checkpointer(cb, filename, keep=2)
+        for cs in ('1', '2', '3'):
+            cb.cs = cs
+            checkpointer.checkpoint()
+        assert sorted(tmpdir.listdir()) == [
+            tmpdir.join('cleverbot.pickle'), tmpdir.join('cleverbot.pickle.1')]
+        assert cleverbot.load(filename).cs == '3'
+        assert cleverbot.load(filename + '.1').cs == '2'
+
+    def test_background(self, cb, tmpdir):
+        filename = str(tmpdir.join('cleverbot.pickle'))
+        with cleverbot.Checkpointer(cb, filename, interval=0.01):
+            cb.cs = 'test'
+        assert cleverbot.load(filename).cs == 'test'
+
+
+class TestScheduler:
+
+    class Convo(object):
+
+        def __init__(self):
+            self.said = []
+            self.event = threading.Event()
+
+        def say(self, input=None, **kwargs):
+            self.said.append(input)
+            self.event.wait(5)
+            return input
+
+    def start(self, func, *args, **kwargs):
+        thread = threading.Thread(target=func, args=args, kwargs=kwargs)
+        thread.start()
+        return thread
+
+    def wait(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        raise AssertionError("Timed out waiting for the scheduler")
+
+    def test_order(self):
+        scheduler = cleverbot.Scheduler(concurrency=1)
+        convo = self.Convo()
+        threads = [self.start(scheduler.say, convo, 'first')]
+        self.wait(lambda: scheduler.active == 1)
+        for input, kwargs in [('low', {}), ('late', {'deadline': 10}),
+                              ('early', {'deadline': 5}),
+                              ('high', {'priority': 1})]:
+            threads.append(self.start(scheduler.say, convo, input, **kwargs))
+            self.wait(lambda: scheduler.queued == len(threads) - 1)
+        convo.event.set()
+        for thread in threads:
+            thread.join()
+        assert convo.said == ['first', 'high', 'early', 'late', 'low']
+        assert scheduler.dispatched == 5
+        assert scheduler.active == 0
+
+    def test_deadline(self):
+        scheduler = cleverbot.Scheduler(concurrency=1)
+        convo = self.Convo()
+        thread = self.start(scheduler.say, convo, 'first')
+        self.wait(lambda: scheduler.active == 1)
+        with pytest.raises(cleverbot.DeadlineExceeded):
+            scheduler.say(convo, 'expired', deadline=0.01)
+        convo.event.set()
+        thread.join()
+        assert convo.said == ['first']
+        assert scheduler.expired == 1
+        assert scheduler.queued == 0
+
+    def test_deadline_passed_on(self):
+        scheduler = cleverbot.Scheduler(concurrency=1)
+        deadlines = []
+
+        class Convo(object):
+            def say(self, input=None, **kwargs):
+                deadlines.append(kwargs.get('deadline'))
+
+        scheduler.say(Convo(), 'test', deadline=10)
+        scheduler.say(Convo(), 'test')
+        assert 0 < deadlines[0] <= 10
+        assert deadlines[1] is None
+
+
+class TestWorkerPool:
+
+    @pytest.mark.parametrize(
+        'cb', [{'json': {'output': 'test', 'cs': 'cs'}}], indirect=True)
+    def test_submit(self, cb):
+        convo = cb.conversation()
+        future = convo.submit('test')
+        assert future.result(5) == 'test'
+        assert isinstance(cb.pool, cleverbot.WorkerPool)
+        assert convo.cs == 'cs'
+
+    @pytest.mark.parametrize(
+        'cb', [{'status': 401, 'json': {}}], indirect=True)
+    def test_submit_error(self, cb):
+        with pytest.raises(cleverbot.APIError):
+            cb.say_nowait().result(5)
+
+    def test_submit_concurrent(self, cb, api, monkeypatch):
+        pools = []
+
+        def create_pool():
+            time.sleep(0.05)  # Give the other threads time to race
+            pools.append(cleverbot.WorkerPool())
+            return pools[-1]
+        monkeypatch.setattr(sys.modules['cleverbot.cleverbot'], 'WorkerPool',
+                            create_pool)
+        futures = []
+        threads = [threading.Thread(
+            target=lambda: futures.append(cb.submit('test')))
+            for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(pools) == 1
+        assert [future.result(5) for future in futures] == ['test'] * 4
+        cb.close()
+
+    def test_submit_deadline(self, cb):
+        pool, event = self.blocked_pool()
+        cb.pool = pool
+        future = cb.submit('test', deadline=0.01)
+        time.sleep(0.02)
+        event.set()
+        with pytest.raises(cleverbot.DeadlineExceeded) as info:
+            future.result(5)
+        assert info.value.phase == 'queue'
+        pool.shutdown()
+
+    def blocked_pool(self, **kwargs):
+        event = threading.Event()
+        pool = cleverbot.WorkerPool(workers=1, maxsize=1, **kwargs)
+        pool.submit(event.wait)
+        while pool.queued:  # Wait for the worker to pick it up
+            time.sleep(0.01)
+        return pool, event
+
+    def test_raise(self):
+        pool, event = self.blocked_pool(overflow='raise')
+        pool.submit(int)
+        with pytest.raises(cleverbot.QueueFull):
+            pool.submit(int)
+        event.set()
+        pool.shutdown()
+
+    def test_block(self):
+        pool, event = self.blocked_pool(overflow='block', timeout=0.01)
+        pool.submit(int)
+        with pytest.raises(cleverbot.QueueFull):
+            pool.submit(int)
+        event.set()
+        pool.shutdown()
+
+    def test_shed(self):
+        pool, event = self.blocked_pool(overflow='shed')
+        old = pool.submit(int, '1')
+        new = pool.submit(int, '2')
+        event.set()
+        pool.shutdown()
+        with pytest.raises(cleverbot.QueueFull):
+            old.result()
+        assert new.result() == 2
+
+    def test_shed_cancelled(self):
+        pool, event = self.blocked_pool(overflow='shed')
+        old = pool.submit(int, '1')
+        assert old.cancel()
+        new = pool.submit(int, '2')
+        event.set()
+        pool.shutdown()
+        assert old.cancelled()
+        assert new.result() == 2
+
+    def test_close(self, cb):
+        cb.pool = cleverbot.WorkerPool()
+        cb.pool.submit(int)
+        cb.close()
+        assert cb.pool is None
+
+    def test_shutdown(self):
+        pool = cleverbot.WorkerPool()
+        future = pool.submit(int, '1')
+        pool.shutdown()
+        assert future.result() == 1
+        with pytest.raises(RuntimeError):
+            pool.submit(int)
+
+
+class TestChat:
+
+    @pytest.fixture
+    def cb(self, monkeypatch):
+        cb = cleverbot.Cleverbot('API_KEY')
+
+        def mock_get(url, params, timeout):
+
+            class MockResponse(object):
+                status_code = 200 if params.get('input') != 'error' else 401
+
+                def json(self):
+                    cs = params.get('cs', '') + params.get('input', '')
+                    return {'output': params.get('input'), 'cs': cs}
+
+            return MockResponse()
+        monkeypatch.setattr(cb.session, 'get', mock_get)
+        return cb
+
+    def test_chat(self, cb):
+        convo = cb.conversation()
+        replies = convo.chat(iter('abc'))
+        assert next(replies) == 'a'
+        assert convo.cs == 'a'
+        assert list(replies) == ['b', 'c']
+        assert convo.cs == 'abc'
+
+    def test_chat_many(self, cb):
+        streams = {cb.conversation(str(i)): str(i) * 20 for i in range(10)}
+        replies = collections.defaultdict(list)
+        for convo, input, reply in cb.chat_many(streams, concurrency=3):
+            assert input == reply
+            replies[convo.name].append(reply)
+        for convo in streams:
+            assert ''.join(replies[convo.name]) == convo.name * 20
+            assert convo.cs == convo.name * 20
+
+    def test_chat_many_error(self, cb):
+        streams = [(cb.conversation(), ['a', 'error', 'b'])]
+        with pytest.raises(cleverbot.APIError):
+            list(cb.chat_many(streams))
+
+
+class TestCLI:
+
+    @pytest.fixture
+    def server(self):
+        from cleverbot.__main__ import FakeServer
+        with FakeServer() as server:
+            yield server
+
+    @pytest.fixture
+    def records(self, tmpdir):
+        records = [{'conversation': str(i % 3), 'input': 'x' * i}
+                   for i in range(1, 16)]
+        path = tmpdir.join('input.jsonl')
+        path.write(''.join(json.dumps(record) + '\n' for record in records))
+        return str(path)
+
+    @staticmethod
+    def run(*argv, **kwargs):
+        from cleverbot.__main__ import add_subparsers, create_parser
+        parser = create_parser()
+        add_subparsers(parser)
+        args = parser.parse_args(['--key', 'KEY'] + list(argv))
+        files = [value for value in vars(args).values()
+                 if isinstance(value, io.IOBase) and
+                 value not in (sys.stdin, sys.stdout)]
+        for name, value in kwargs.items():
+            setattr(args, name, value)
+        try:
+            parser.func(parser, args)
+        finally:
+            for file in files:
+                file.close()
+
+    def batch(self, server, *argv, **kwargs):
+        self.run('batch', '--url', server.url, '-w', '2', *argv, **kwargs)
+
+    @staticmethod
+    def read(path):
+        with open(path) as file:
+            return [json.loads(line) for line in file]
+
+    def test_batch(self, server, records, tmpdir):
+        output = str(tmpdir.join('output.jsonl'))
+        self.batch(server, records, '-o', output)
+        results = self.read(output)
+        assert len(results) == 15
+        for result in results:
+            assert result['output'] == result['input']
+        states = {result['conversation']: result['cs'] for result in results}
+        assert states == {'0': '369cf', '1': '147ad', '2': '258be'}
+
+    def test_batch_resume(self, server, records, tmpdir):
+        output = str(tmpdir.join('output.jsonl'))
+        checkpoint = str(tmpdir.join('checkpoint.jsonl'))
+
+        def interrupt(lines):
+            for number, line in enumerate(lines):
+                if number == 7:
+                    raise KeyboardInterrupt
+                yield line
+
+        with open(records) as input:
+            with pytest.raises(KeyboardInterrupt):
+                self.batch(server, records, '-o', output, '-c', checkpoint,
+                           '--checkpoint-interval', '2',
+                           input=interrupt(input))
+        first = self.read(output)
+        assert len(first) == 7
+        assert self.read(checkpoint) == first
+        # The last result was cut off while being appended
+        with open(checkpoint, 'r+') as file:
+            lines = file.readlines()
+            file.seek(0)
+            file.truncate()
+            file.write(''.join(lines[:-1]) + lines[-1][:10])
+
+        resumed = str(tmpdir.join('resumed.jsonl'))
+        self.batch(server, records, '-o', resumed, '-c', checkpoint)
+        second = self.read(resumed)
+        assert len(second) == 9
+        results = first[:-1] + second
+        inputs = sorted(len(result['input']) for result in results)
+        assert inputs == list(range(1, 16))
+        states = {result['conversation']: result['cs'] for result in results}
+        assert states == {'0': '369cf', '1': '147ad', '2': '258be'}
+        assert self.read(checkpoint) == results
+
+    def test_profile(self, tmpdir):
+        output = str(tmpdir.join('profile.txt'))
+        self.run('profile', '-n', '3', '-t', '2', '--top', '5', '-o', output)
+        with open(output) as file:
+            report = file.read()
+        assert 'profile: 3 conversations, 2 turns' in report
+        assert 'function calls' in report
+        if tracemalloc is None:
+            return
+        assert 'Peak traced memory' in report
+        table = report.split('Allocations held in cleverbot')[1]
+        rows = [line.split() for line in table.splitlines()[3:] if line]
+        assert 0 < len(rows) <= 5
+        assert all(int(size) > 0 for size, _, _ in rows)
+        # The live conversations show up instead of leftover caches
+        assert any(function.startswith(('base.py', 'cleverbot.py'))
+                   for _, _, function in rows)
+
+    def test_bench(self, server, capsys):
+        from cleverbot.__main__ import FakeServer
+        requests = []
+
+        class Handler(FakeServer.Handler):
+
+            def do_GET(self):
+                requests.append(None)
+                number = len(requests)
+                if number % 3 == 1:
+                    return FakeServer.Handler.do_GET(self)
+                if number % 3 == 2:
+                    time.sleep(0.1)  # Past the timeout
+                    status = 200
+                else:
+                    status = 500
+                body = json.dumps({'error': 'error', 'status': status})
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body.encode('ascii'))
+                except socket.error:
+                    pass
+
+        server.RequestHandlerClass = Handler
+        self.run('--timeout', '0.05', 'bench', '--url', server.url, '--json',
+                 '-d', '0.2', '-c', '2', '-n', '2')
+        report = json.loads(capsys.readouterr().out)
+        assert list(report) == ['requests', 'successes', 'errors', 'duration',
+                                'throughput', 'latency_ms']
+        assert report['successes'] > 0
+        assert set(report['errors']) == {'APIError', 'Timeout'}
+        assert report['requests'] == (report['successes'] +
+                                      sum(report['errors'].values()))
+        assert report['duration'] >= 0.2
+        percentiles = report['latency_ms']
+        assert list(percentiles) == ['mean', 'p50', 'p90', 'p95', 'p99',
+                                     'p99.9', 'max']
+        assert percentiles['p50'] <= percentiles['p99'] <= percentiles['max']
@@ -0,0 +1,115 @@
+import gc
+import io
+import os
+import time
+
+import pytest
+
+import cleverbot
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# Set CLEVERBOT_SCALING_MAX=1000000 to go up to a million conversations
+MAX = int(os.environ.get('CLEVERBOT_SCALING_MAX', 10000))
+SIZES = [size for size in (1000, 10000, 100000, 1000000) if size <= MAX]
+# Compare against 10k when possible as 1k still fits in the CPU caches
+BASELINE = SIZES[1] if len(SIZES) > 2 else SIZES[0]
+# How much slower a conversation may get at the largest size than at BASELINE
+GROWTH = 3
+# How many bytes a conversation may take up at most
+BUDGETS = {'create': 1536, 'save': 1024, 'load': 2048, 'reset': 1024}
+
+pytestmark = [
+    pytest.mark.skipif(tracemalloc is None, reason="requires tracemalloc"),
+    pytest.mark.filterwarnings('ignore::DeprecationWarning'),
+]
+
+
+def measure(traced, func, *args):
+    """Call func and get its result with either how long it took or, if
+    traced, its peak memory use. The two are measured in separate calls so
+    tracemalloc doesn't slow down the timings.
+    """
+    gc.collect()
+    if not traced:
+        start = clock()
+        result = func(*args)
+        return result, clock() - start
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def create(size, named):
+    cb = cleverbot.Cleverbot('API_KEY', cs='76nxdxIJ02AAA', timeout=60,
+                             tweak1=25, tweak2=50, tweak3=75)
+    # Nameless conversations only live as long as they're referenced
+    convos = [cb.conversation(s if named else None, key=s, cs=s, timeout=i)
+              for i, s in enumerate(map(str, range(size)))]
+    return cb, convos
+
+
+def save(cb):
+    with io.BytesIO() as f:
+        cb.save(f)
+        return f.getvalue()
+
+
+def load(data):
+    with io.BytesIO(data) as f:
+        return cleverbot.load(f)
+
+
+def run(named, traced):
+    results = {}
+    for size in SIZES:
+        (cb, convos), results['create', size] = measure(traced, create, size,
+                                                        named)
+        data, results['save', size] = measure(traced, save, cb)
+        _, results['load', size] = measure(traced, load, data)
+        _, results['reset', size] = measure(traced, cb.reset)
+        del cb, convos, data, _
+    return results
+
+
+@pytest.fixture(scope='module', params=['named', 'nameless'])
+def named(request):
+    return request.param == 'named'
+
+
+@pytest.fixture(scope='module')
+def timings(named):
+    return run(named, traced=False)
+
+
+@pytest.fixture(scope='module')
+def peaks(named):
+    return run(named, traced=True)
+
+
+@pytest.mark.parametrize('operation', ['create', 'save', 'load', 'reset'])
+def test_time(timings, operation):
+    if len(SIZES) < 2:
+        pytest.skip("not enough sizes to compare")
+    per_convo = {size: timings[operation, size] / size for size in SIZES}
+    growth = per_convo[SIZES[-1]] / per_convo[BASELINE]
+    assert growth < GROWTH, (
+        "{} takes {:.1f}x as long per conversation at {} conversations as "
+        "at {}".format(operation, growth, SIZES[-1], BASELINE))
+
+
+@pytest.mark.parametrize('operation', ['create', 'save', 'load', 'reset'])
+def test_memory(peaks, operation):
+    for size in SIZES:
+        per_convo = peaks[operation, size] / size
+        assert per_convo < BUDGETS[operation], (
+            "{} takes up {:.0f} bytes per conversation at {} conversations"
+            .format(operation, per_convo, size))